@@ -0,0 +1,294 @@
+import base64
+import html
+import os
+import re
+import sqlite3
+import threading
+import time
+from logging_config import get_logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ads (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    price TEXT,
+    price_value REAL,
+    keywords TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ads_sent_at ON ads (sent_at, id);
+CREATE INDEX IF NOT EXISTS ads_keywords_sent_at ON ads (keywords, sent_at, id);
+CREATE INDEX IF NOT EXISTS ads_price_value ON ads (price_value, id);
+"""
+
+# Índice de texto dos títulos (conteúdo externo: o texto fica só em ads).
+# remove_diacritics 2 faz "cafe" encontrar "Café" e "acao" encontrar "ação".
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+    title, content='ads', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS ads_fts_insert AFTER INSERT ON ads BEGIN
+    INSERT INTO ads_fts (rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_delete AFTER DELETE ON ads BEGIN
+    INSERT INTO ads_fts (ads_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_update AFTER UPDATE OF title ON ads BEGIN
+    INSERT INTO ads_fts (ads_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO ads_fts (rowid, title) VALUES (new.id, new.title);
+END;
+"""
+
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 100
+RANK_WINDOW = 1000
+# Marcadores do highlight do FTS: trocados por <mark> só depois de escapar o título
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+def parse_price(price):
+    """'R$ 1.234,56' -> 1234.56; None se não houver valor"""
+    if not price:
+        return None
+    match = re.search(r"\d[\d.]*(,\d+)?", str(price))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(".", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def fts_query(text):
+    """Converte o texto digitado numa consulta FTS5 segura (todas as palavras, 'ipho*' = prefixo)"""
+    terms = []
+    for term in str(text or "").split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms)
+
+
+def encode_cursor(sent_at, ad_id):
+    return base64.urlsafe_b64encode(f"{sent_at!r}:{ad_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Cursor opaco -> (sent_at, id) do último item da página anterior"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sent_at, ad_id = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        return float(sent_at), int(ad_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor inválido")
+
+
+class AdStore:
+    """Arquivo SQLite dos anúncios entregues, consultável pelo painel.
+
+    Cada thread usa sua própria conexão; WAL permite que os workers web leiam
+    enquanto o monitor grava. A paginação é por keyset (sent_at, id) sobre os
+    índices, sem OFFSET.
+    """
+
+    def __init__(self, db_file=None):
+        if db_file is None:
+            data_dir = os.path.join(os.path.expanduser("~"), ".marketroxo_data")
+            os.makedirs(data_dir, exist_ok=True)
+            self.db_file = os.path.join(data_dir, "ads.db")
+        else:
+            self.db_file = db_file
+        self._local = threading.local()
+        self.fts_enabled = False
+        self._init_schema()
+
+    @property
+    def logger(self):
+        """Property que sempre retorna o logger atualizado"""
+        return get_logger()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        try:
+            existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ads_fts'").fetchone()
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+                if not existed:
+                    # Banco criado antes do índice de texto: indexa os títulos já gravados
+                    conn.execute("INSERT INTO ads_fts (ads_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"⚠️ SQLite sem FTS5, busca por texto desativada: {str(e)}")
+
+    def add_ads(self, ads, keywords, sent_at=None):
+        """Grava anúncios entregues: ads é uma lista de (hash, anúncio). Ignora hashes já gravados."""
+        if not ads:
+            return 0
+        sent_at = sent_at or time.time()
+        keyword_set = ", ".join(keywords) if isinstance(keywords, (list, tuple)) else str(keywords)
+        rows = [
+            (ad_hash, ad.get('title', ''), ad.get('url', ''), ad.get('price'), parse_price(ad.get('price')),
+             keyword_set, ad.get('first_seen', sent_at), sent_at)
+            for ad_hash, ad in ads
+        ]
+        conn = self._connect()
+        with conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO ads (hash, title, url, price, price_value, keywords, first_seen, sent_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return cursor.rowcount
+
+    def get_ad(self, ad_hash):
+        row = self._connect().execute("SELECT * FROM ads WHERE hash = ?", (ad_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def list_ads(self, cursor=None, limit=50, keywords=None, since=None, until=None,
+                 min_price=None, max_price=None):
+        """Página de anúncios do mais recente para o mais antigo.
+           since/until são epochs (since <= sent_at < until).
+           Retorna {'ads': [...], 'next_cursor': str ou None}."""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if keywords:
+            clauses.append("keywords = ?")
+            params.append(keywords)
+        if since is not None:
+            clauses.append("sent_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("sent_at < ?")
+            params.append(until)
+        if min_price is not None:
+            clauses.append("price_value >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("price_value <= ?")
+            params.append(max_price)
+        if cursor:
+            last_sent_at, last_id = decode_cursor(cursor)
+            clauses.append("(sent_at, id) < (?, ?)")
+            params.extend([last_sent_at, last_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT * FROM ads {where} ORDER BY sent_at DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        ads = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(ads[-1]['sent_at'], ads[-1]['id']) if len(rows) > limit else None
+        return {'ads': ads, 'next_cursor': next_cursor}
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+
+    def _rowid_bounds(self, since, until):
+        """Converte o período em faixa de ids (ids crescem junto com sent_at).
+           Restringir o rowid faz o FTS5 ler só esse trecho das listas de documentos."""
+        conn = self._connect()
+        low = high = None
+        if since is not None:
+            row = conn.execute("SELECT id FROM ads WHERE sent_at >= ? ORDER BY sent_at, id LIMIT 1", (since,)).fetchone()
+            low = row[0] if row else float('inf')
+        if until is not None:
+            row = conn.execute("SELECT id FROM ads WHERE sent_at < ? ORDER BY sent_at DESC, id DESC LIMIT 1", (until,)).fetchone()
+            high = row[0] if row else -1
+        return low, high
+
+    @staticmethod
+    def _fts_clauses(query, low, high):
+        clauses, params = ["ads_fts MATCH ?"], [query]
+        if low is not None:
+            clauses.append("ads_fts.rowid >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append("ads_fts.rowid <= ?")
+            params.append(high)
+        return clauses, params
+
+    @staticmethod
+    def _escape_highlight(text):
+        """Título em HTML escapado, com os trechos encontrados entre <mark>"""
+        return (html.escape(text or '')
+                .replace(HIGHLIGHT_START, '<mark>')
+                .replace(HIGHLIGHT_END, '</mark>'))
+
+    def search(self, text, limit=20, sort='rank', cursor=None, keywords=None, since=None, until=None):
+        """Busca nos títulos com ranking bm25 e trecho destacado (title_highlight: título escapado para HTML, com <mark>).
+
+        sort='rank' devolve os mais relevantes entre as RANK_WINDOW ocorrências
+        mais recentes (limita o custo do bm25 em termos muito comuns);
+        sort='recent' devolve do mais novo ao mais antigo, paginado por cursor.
+        """
+        if not self.fts_enabled:
+            raise RuntimeError("Busca por texto indisponível (SQLite sem FTS5)")
+        query = fts_query(text)
+        if not query:
+            raise ValueError("Informe o texto da busca")
+        if sort not in ('rank', 'recent'):
+            raise ValueError(f"Ordenação inválida: {sort}")
+        limit = max(1, min(int(limit), MAX_SEARCH_RESULTS))
+        conn = self._connect()
+
+        low, high = self._rowid_bounds(since, until)
+        if sort == 'recent' and cursor:
+            try:
+                high = min(high if high is not None else float('inf'), int(cursor) - 1)
+            except ValueError:
+                raise ValueError("Cursor inválido")
+        if sort == 'rank':
+            # Menor rowid entre as RANK_WINDOW ocorrências mais novas (só percorre a lista de ids)
+            window_clauses, window_params = self._fts_clauses(query, low, high)
+            row = conn.execute(
+                f"SELECT rowid FROM ads_fts WHERE {' AND '.join(window_clauses)} ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                window_params + [RANK_WINDOW - 1]
+            ).fetchone()
+            if row:
+                low = max(low or 0, row[0])
+        # O FTS5 só aproveita uma restrição por lado do rowid, então os limites são combinados antes
+        fts_clauses, fts_params = self._fts_clauses(query, low, high)
+
+        # '+' impede o SQLite de trocar o FTS pelos índices de ads como ponto de partida
+        clauses, params = list(fts_clauses), list(fts_params)
+        if keywords:
+            clauses.append("+ads.keywords = ?")
+            params.append(keywords)
+        if since is not None:
+            clauses.append("+ads.sent_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("+ads.sent_at < ?")
+            params.append(until)
+        order = "ads_fts.rowid DESC" if sort == 'recent' else "ads_fts.rank"
+
+        rows = conn.execute(
+            "SELECT ads.*, highlight(ads_fts, 0, ?, ?) AS title_highlight, "
+            "bm25(ads_fts) AS score "
+            f"FROM ads_fts JOIN ads ON ads.id = ads_fts.rowid WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {order} LIMIT ?",
+            [HIGHLIGHT_START, HIGHLIGHT_END] + params + [limit + 1]
+        ).fetchall()
+
+        ads = [dict(row) for row in rows[:limit]]
+        for ad in ads:
+            ad['title_highlight'] = self._escape_highlight(ad['title_highlight'])
+        next_cursor = str(ads[-1]['id']) if sort == 'recent' and len(rows) > limit else None
+        return {'ads': ads, 'next_cursor': next_cursor}
@@ -0,0 +1,90 @@
+import copy
+import json
+import os
+import threading
+from logging_config import get_logger
+
+
+class ConfigStore:
+    """config.json com cache por mtime e gravação atômica.
+
+    load() só relê o arquivo quando mtime/tamanho mudam (outro worker ou o
+    daemon pode ter salvo); save() grava num temporário e faz rename, então
+    leitores nunca veem um JSON pela metade.
+    """
+
+    def __init__(self, path='config.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data = {}
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+
+    @property
+    def logger(self):
+        """Property que sempre retorna o logger atualizado"""
+        return get_logger()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def load(self):
+        """Configuração atual (cópia); {} se o arquivo não existe ou é inválido"""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature:
+                if signature is None:
+                    self._data = {}
+                else:
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            self._data = json.load(f)
+                    except Exception as e:
+                        self.logger.error(f"Erro ao carregar {self.path}: {e}")
+                        self._data = {}
+                self._signature = signature
+            return copy.deepcopy(self._data)
+
+    def save(self, data):
+        """Grava de forma atômica (temporário + fsync + rename)"""
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.path)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        with self._lock:
+            self._data = copy.deepcopy(data)
+            self._signature = self._file_signature()
+
+    def watch(self, callback, interval=5):
+        """Chama callback(config) quando outro processo salvar o arquivo (checa o mtime)"""
+        if self._watch_thread and self._watch_thread.is_alive() and not self._watch_stop.is_set():
+            return
+        # Evento próprio de cada watcher: um antigo ainda dormindo não enxerga o evento do novo
+        stop = self._watch_stop = threading.Event()
+
+        def run():
+            while not stop.wait(timeout=interval):
+                if self._file_signature() == self._signature:
+                    continue
+                try:
+                    callback(self.load())
+                except Exception as e:
+                    self.logger.error(f"❌ Erro ao aplicar configuração alterada: {str(e)}")
+
+        self._watch_thread = threading.Thread(target=run, name="config-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self):
+        self._watch_stop.set()
@@ -7,7 +7,9 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# gthread: conexões longas (SSE do painel de saúde, downloads) ocupam uma thread, não o worker inteiro
+worker_class = "gthread"
+threads = 4
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -38,17 +40,9 @@ tmp_upload_dir = None
 
 def post_fork(server, worker):
     """Called after worker processes are forked"""
-    import signal
     from logging_config import setup_4hour_rotation, get_logger
     
-    # Setup signal handler para recarregar logging
-    def reload_logging(signum, frame):
-        setup_4hour_rotation()
-        logger = get_logger()
-        logger.info(f"Worker {worker.pid} recarregou logging após sinal")
-    
-    signal.signal(signal.SIGUSR1, reload_logging)
-    
+    # Rotações forçadas chegam pela geração em memória compartilhada (logging_config.get_logger)
     # Setup logging for this worker with process-safe handlers
     setup_4hour_rotation()
     logger = get_logger()
@@ -0,0 +1,92 @@
+import math
+import os
+import random
+
+# Divide o orçamento de páginas do ciclo entre os subconjuntos de palavras-chave por
+# amostragem de Thompson (Gamma-Poisson): anúncios novos entregues por request ~ Poisson(taxa),
+# taxa ~ Gamma(PRIOR_ADS + entregues, PRIOR_REQUESTS + requests), com os contadores de
+# rendimento do RequestStats. Até uma fração do orçamento garante uma página aos conjuntos
+# com pouca evidência (menos de EXPLORE_MAX_REQUESTS requests).
+SUBSET_EXPLORATION = float(os.getenv('SUBSET_EXPLORATION', '0.25'))
+EXPLORE_MAX_REQUESTS = 20
+PRIOR_ADS = 1.0
+PRIOR_REQUESTS = 4.0
+# Teto de evidência por conjunto: o histórico antigo não congela a estimativa (o rendimento muda)
+MAX_EVIDENCE_REQUESTS = 200
+
+
+class KeywordSetAllocator:
+    """Decide quais subconjuntos raspar no ciclo e com quantas páginas cada um"""
+
+    def __init__(self, exploration=SUBSET_EXPLORATION, rng=None):
+        self.exploration = min(max(exploration, 0.0), 1.0)
+        self.rng = rng or random.Random()
+        self.last_plan = []
+
+    @staticmethod
+    def evidence(counters):
+        """(entregues, requests) do conjunto, reescalados para no máximo MAX_EVIDENCE_REQUESTS"""
+        requests = counters.get('requests', 0) if counters else 0
+        delivered = counters.get('ads_delivered', 0) if counters else 0
+        if requests > MAX_EVIDENCE_REQUESTS:
+            delivered = delivered * MAX_EVIDENCE_REQUESTS / requests
+            requests = MAX_EVIDENCE_REQUESTS
+        return delivered, requests
+
+    def sample_rate(self, counters):
+        delivered, requests = self.evidence(counters)
+        return self.rng.gammavariate(PRIOR_ADS + delivered, 1.0 / (PRIOR_REQUESTS + requests))
+
+    def allocate(self, candidates, yield_counters, budget, max_pages):
+        """Plano do ciclo: [(subconjunto, páginas)] somando no máximo budget páginas.
+
+        candidates: tuplas de palavras-chave; yield_counters: {tupla: contadores de rendimento}.
+        Os conjuntos com pouca evidência (os menos testados primeiro) ganham uma página garantida
+        na parte de exploração; depois todos disputam o orçamento pela taxa sorteada, com
+        profundidade proporcional a ela, e o que sobrar completa os melhores até max_pages.
+        """
+        budget = max(1, int(budget))
+        max_pages = max(1, int(max_pages))
+        candidates = list(dict.fromkeys(candidates))
+        pages = {}
+
+        if len(candidates) > 1 and budget > 1 and self.exploration > 0:
+            explore_pages = min(len(candidates) - 1, max(1, math.floor(budget * self.exploration)))
+            untested = [subset for subset in candidates
+                        if self.evidence(yield_counters.get(subset))[1] < EXPLORE_MAX_REQUESTS]
+            # Menos requests primeiro; empate decidido ao acaso
+            untested.sort(key=lambda subset: (self.evidence(yield_counters.get(subset))[1], self.rng.random()))
+            explored = untested[:explore_pages]
+            pages.update((subset, 1) for subset in explored)
+        else:
+            explored = []
+
+        remaining = budget - len(explored)
+        rates = {subset: self.sample_rate(yield_counters.get(subset)) for subset in candidates}
+        ranked = sorted(candidates, key=lambda subset: rates[subset], reverse=True)
+        top_rate = rates[ranked[0]] if ranked else 0
+        for subset in ranked:
+            if remaining <= 0:
+                break
+            wanted = math.ceil(max_pages * rates[subset] / top_rate) if top_rate > 0 else 1
+            extra = min(max(1, min(wanted, max_pages)) - pages.get(subset, 0), remaining)
+            if extra > 0:
+                pages[subset] = pages.get(subset, 0) + extra
+                remaining -= extra
+        # Sobra do orçamento (taxas baixas pediram menos páginas): completa na ordem das taxas
+        for subset in ranked:
+            if remaining <= 0:
+                break
+            extra = min(max_pages - pages.get(subset, 0), remaining)
+            if extra > 0:
+                pages[subset] = pages.get(subset, 0) + extra
+                remaining -= extra
+
+        plan = [{
+            'keywords': subset,
+            'pages': pages[subset],
+            'mode': 'explore' if subset in explored and pages[subset] == 1 else 'exploit',
+            'rate': round(rates[subset], 4),
+        } for subset in ranked if subset in pages]
+        self.last_plan = plan
+        return [(entry['keywords'], entry['pages']) for entry in plan]
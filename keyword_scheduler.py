@@ -0,0 +1,130 @@
+import os
+import random
+import threading
+import time
+
+# Intervalo de consulta próprio de cada conjunto de palavras-chave: a taxa de chegada de
+# anúncios novos é estimada com somas decrescentes (anúncios / tempo entre consultas) e o
+# intervalo mira POLL_TARGET_NEW_ADS anúncios novos por consulta, dentro de [mínimo, máximo].
+POLL_TARGET_NEW_ADS = float(os.getenv('POLL_TARGET_NEW_ADS', '1'))
+RATE_DECAY = 0.8  # peso das consultas anteriores na estimativa
+# Conjuntos que vencem logo depois (até DUE_SLACK segundos, no máximo 10% do intervalo
+# mínimo) entram na mesma rodada, em vez de acordar o loop de novo segundos depois
+DUE_SLACK = 30
+
+
+class KeywordSetScheduler:
+    """Próximo horário de consulta de cada conjunto de palavras-chave (epoch)"""
+
+    def __init__(self, base_interval, min_interval, max_interval,
+                 target_new_ads=POLL_TARGET_NEW_ADS, decay=RATE_DECAY):
+        self.target_new_ads = target_new_ads
+        self.decay = decay
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.configure(base_interval, min_interval, max_interval)
+
+    def configure(self, base_interval, min_interval, max_interval):
+        """Atualiza os limites (segundos); intervalos já calculados são reenquadrados"""
+        self.min_interval = max(1.0, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.base_interval = self._clamp(base_interval)
+        with self._lock:
+            for entry in self.entries.values():
+                interval = self._clamp(entry['interval'])
+                if interval != entry['interval'] and entry['last_poll'] is not None:
+                    entry['next_due'] = entry['last_poll'] + interval
+                entry['interval'] = interval
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, float(interval)))
+
+    def _entry(self, keywords):
+        entry = self.entries.get(keywords)
+        if entry is None:
+            # Estimativa inicial: target_new_ads por intervalo base (primeiro intervalo = base)
+            entry = self.entries[keywords] = {
+                'next_due': 0.0,
+                'interval': self.base_interval,
+                'last_poll': None,
+                'ads': self.target_new_ads,
+                'elapsed': self.base_interval,
+                'polls': 0,
+            }
+        return entry
+
+    def _sync(self, candidates, now):
+        """Descarta conjuntos que saíram da configuração e registra os novos com o primeiro
+           vencimento espalhado pelo intervalo base (o primeiro vence na hora), para que
+           centenas de subconjuntos novos não vençam todos juntos"""
+        keep = set(candidates)
+        for keywords in [keywords for keywords in self.entries if keywords not in keep]:
+            del self.entries[keywords]
+        new = [keywords for keywords in dict.fromkeys(candidates) if keywords not in self.entries]
+        random.shuffle(new)
+        for position, keywords in enumerate(new):
+            self._entry(keywords)['next_due'] = now + self.base_interval * position / len(new)
+
+    def next_due(self, candidates, now=None):
+        """Horário em que o primeiro dos candidatos vence"""
+        now = now or time.time()
+        with self._lock:
+            self._sync(candidates, now)
+            return min((self.entries[keywords]['next_due'] for keywords in candidates), default=None)
+
+    def due(self, candidates, now=None):
+        """Candidatos vencidos, do mais atrasado ao menos. Quais deles são consultados
+           (e com quantas páginas) é decisão de quem chama, dentro do orçamento do ciclo."""
+        now = now or time.time()
+        slack = min(DUE_SLACK, self.min_interval / 10)
+        with self._lock:
+            self._sync(candidates, now)
+            due = sorted((entry['next_due'], index, keywords)
+                         for index, keywords in enumerate(candidates)
+                         for entry in (self.entries[keywords],) if entry['next_due'] <= now + slack)
+        return [keywords for _, _, keywords in due]
+
+    def mark_selected(self, keyword_sets, now=None):
+        """Conjuntos escolhidos para a rodada já ficam agendados para daqui a um intervalo
+           (um ciclo abortado não os repete); os vencidos que ficaram de fora seguem vencidos"""
+        now = now or time.time()
+        with self._lock:
+            for keywords in keyword_sets:
+                entry = self._entry(keywords)
+                entry['next_due'] = now + entry['interval']
+
+    def record_poll(self, keywords, started, new_ads):
+        """Registra uma consulta e recalcula o intervalo. A primeira só marca o início da contagem
+           (os anúncios dela acumularam por tempo indeterminado)."""
+        with self._lock:
+            entry = self._entry(keywords)
+            if entry['last_poll'] is not None:
+                entry['ads'] = entry['ads'] * self.decay + new_ads
+                entry['elapsed'] = entry['elapsed'] * self.decay + max(0.0, started - entry['last_poll'])
+                rate = entry['ads'] / entry['elapsed'] if entry['elapsed'] > 0 else 0
+                entry['interval'] = self._clamp(self.target_new_ads / rate if rate > 0 else self.max_interval)
+            entry['last_poll'] = started
+            entry['polls'] += 1
+            entry['next_due'] = started + entry['interval']
+            return entry['interval']
+
+    def record_failure(self, keywords, now=None):
+        """Consulta sem nenhuma página raspada (bloqueio, proxy...): não diz nada sobre a taxa
+           de anúncios, então o intervalo fica como está e o conjunto volta no intervalo mínimo"""
+        now = now or time.time()
+        with self._lock:
+            entry = self._entry(keywords)
+            entry['next_due'] = now + self.min_interval
+            return self.min_interval
+
+    def snapshot(self, limit=20):
+        """Próximos conjuntos a vencer, para o estado publicado"""
+        with self._lock:
+            entries = sorted(self.entries.items(), key=lambda item: item[1]['next_due'])[:limit]
+            return [{
+                'keywords': ", ".join(keywords),
+                'next_due': round(entry['next_due'], 1),
+                'interval': round(entry['interval'], 1),
+                'new_per_hour': round(entry['ads'] / entry['elapsed'] * 3600, 3) if entry['elapsed'] > 0 else None,
+                'polls': entry['polls'],
+            } for keywords, entry in entries]
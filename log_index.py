@@ -0,0 +1,342 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+from log_reader import LOG_LEVELS, LOG_TIMEZONE, list_log_files, line_level
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Índices ficam em logs/.index/<arquivo>.json: fora dos globs app.log.* e *.log.*
+INDEX_DIR_NAME = '.index'
+INDEX_VERSION = 1
+SCAN_BLOCK_SIZE = 1024 * 1024  # leitura de arquivos sem índice (app.log atual)
+DECOMPRESS_READ_SIZE = 64 * 1024  # pedaços lidos ao percorrer um arquivo comprimido inteiro
+MAX_SEARCH_MATCHES = 1000
+
+_HEADER_RE = re.compile(rb'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) - ([DIWEC]) - ', re.M)
+# Tokens indexados: tipos de erro (ValueError, ReadTimeout...) e URLs (host e endereço sem query)
+_ERROR_TYPE_RE = re.compile(r'\b[A-Z][A-Za-z0-9_]*(?:Error|Exception|Timeout)\b')
+_URL_RE = re.compile(r'https?://([^/\s\'"<>()]+)([^\s\'"<>()?#]*)')
+
+
+def extract_tokens(text):
+    """Tokens de busca exata de um texto, em minúsculas"""
+    tokens = {match.lower() for match in _ERROR_TYPE_RE.findall(text)}
+    for host, path in _URL_RE.findall(text):
+        host = host.lower().rstrip('.,;:')
+        tokens.add(host)
+        if path.rstrip('/.,;:'):
+            tokens.add(host + path.rstrip('.,;:'))
+    return tokens
+
+
+def index_path(log_path):
+    return os.path.join(os.path.dirname(log_path), INDEX_DIR_NAME, os.path.basename(log_path) + '.json')
+
+
+def compression_of(log_path):
+    if log_path.endswith('.gz'):
+        return 'gzip'
+    if log_path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+class LogIndexBuilder:
+    """Acumula o índice de um arquivo bloco a bloco (cada bloco = linhas completas).
+
+    Por bloco guarda a posição no arquivo, o primeiro/último horário e os níveis
+    presentes; os tokens apontam para a lista de blocos em que aparecem.
+    """
+
+    def __init__(self, compression=None):
+        self.compression = compression
+        self.blocks = []
+        self.tokens = {}
+
+    def add_block(self, offset, length, data):
+        headers = _HEADER_RE.findall(data)
+        block_id = len(self.blocks)
+        self.blocks.append({
+            'offset': offset,
+            'length': length,
+            'start': headers[0][0].decode() if headers else None,
+            'end': headers[-1][0].decode() if headers else None,
+            'levels': "".join(sorted({level.decode() for _, level in headers}, key=LOG_LEVELS.index)),
+        })
+        for token in extract_tokens(data.decode('utf-8', errors='replace')):
+            self.tokens.setdefault(token, []).append(block_id)
+
+    def to_dict(self, log_path):
+        return {
+            'version': INDEX_VERSION,
+            'file': os.path.basename(log_path),
+            'compression': self.compression,
+            'blocks': self.blocks,
+            'tokens': self.tokens,
+        }
+
+    def save(self, log_path):
+        """Grava o índice ao lado do arquivo (temporário + rename)"""
+        target = index_path(log_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_file = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(log_path), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, target)
+        return target
+
+
+def _new_decompressor(compression, log_path):
+    if compression == 'gzip':
+        return zlib.decompressobj(wbits=31)
+    if zstandard is None:
+        raise RuntimeError(f"Pacote zstandard não instalado para ler {os.path.basename(log_path)}")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _iter_blocks(log_path):
+    """(offset, tamanho, dados) de cada bloco: membros gzip, frames zstd ou ~1MB de linhas em texto puro"""
+    compression = compression_of(log_path)
+    with open(log_path, 'rb') as f:
+        if compression is None:
+            offset = 0
+            while True:
+                data = f.read(SCAN_BLOCK_SIZE)
+                if not data:
+                    return
+                data += f.readline()
+                yield offset, len(data), data
+                offset += len(data)
+        # Lê o arquivo em pedaços: cada membro/frame termina no eof do descompressor e
+        # o que sobrou do pedaço (unused_data) abre o próximo, sem recopiar o resto do arquivo
+        offset = 0
+        pending = b""
+        while True:
+            decompressor = _new_decompressor(compression, log_path)
+            parts = []
+            consumed = 0
+            while not decompressor.eof:
+                chunk = pending or f.read(DECOMPRESS_READ_SIZE)
+                pending = b""
+                if not chunk:
+                    break
+                parts.append(decompressor.decompress(chunk))
+                consumed += len(chunk)
+            if not consumed:
+                return
+            pending = decompressor.unused_data if decompressor.eof else b""
+            length = consumed - len(pending)
+            yield offset, length, b"".join(parts)
+            offset += length
+            if not decompressor.eof:
+                return  # último membro truncado: entrega o que deu para descomprimir
+
+
+def _iter_plain_blocks_reversed(log_path):
+    """Blocos de ~1MB de um arquivo texto, do fim para o início, começando em início de linha"""
+    with open(log_path, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        while end > 0:
+            start = max(0, end - SCAN_BLOCK_SIZE)
+            f.seek(start)
+            data = f.read(end - start)
+            if start > 0:
+                cut = data.find(b"\n") + 1  # descarta a linha cortada; ela vai no próximo bloco
+                if cut:
+                    start += cut
+                    data = data[cut:]
+            yield data
+            end = start
+
+
+def build_index(log_path):
+    """Indexa um arquivo já existente (arquivos comprimidos antes do índice ou sem compressão)"""
+    builder = LogIndexBuilder(compression_of(log_path))
+    for offset, length, data in _iter_blocks(log_path):
+        builder.add_block(offset, length, data)
+    return builder.save(log_path)
+
+
+def remove_orphan_indexes(log_dir):
+    """Apaga índices cujo arquivo de log já foi removido pela retenção"""
+    index_dir = os.path.join(log_dir, INDEX_DIR_NAME)
+    if not os.path.isdir(index_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(index_dir):
+        if name.endswith('.json') and not os.path.exists(os.path.join(log_dir, name[:-len('.json')])):
+            try:
+                os.remove(os.path.join(index_dir, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+_index_cache = {}
+_index_cache_lock = threading.Lock()
+
+
+def load_index(log_path):
+    """Índice do arquivo (None se não houver); cacheado por mtime do índice"""
+    path = index_path(log_path)
+    try:
+        signature = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _index_cache_lock:
+        cached = _index_cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION:
+        return None
+    with _index_cache_lock:
+        if len(_index_cache) > 256:
+            _index_cache.clear()
+        _index_cache[path] = (signature, index)
+    return index
+
+
+def read_block(log_path, block, compression):
+    with open(log_path, 'rb') as f:
+        f.seek(block['offset'])
+        data = f.read(block['length'])
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f"Pacote zstandard não instalado para ler {os.path.basename(log_path)}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def time_key(timestamp):
+    """Epoch -> 'YYYY-MM-DD HH:MM:SS' em GMT-3 (comparável direto com o início das linhas)"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, LOG_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class _SearchFilter:
+    """Agrupa linha de cabeçalho + continuações (tracebacks) e filtra o registro inteiro"""
+
+    def __init__(self, since_key, until_key, levels, text, token):
+        self.since_key = since_key
+        self.until_key = until_key
+        self.levels = levels
+        self.text = text
+        self.token = token
+
+    def block_may_match(self, block, token_blocks, block_id):
+        if token_blocks is not None and block_id not in token_blocks:
+            return False
+        if self.levels is not None and block['levels'] and not self.levels.intersection(block['levels']):
+            return False
+        if self.since_key and block['end'] and block['end'] < self.since_key:
+            return False
+        if self.until_key and block['start'] and block['start'] >= self.until_key:
+            return False
+        return True
+
+    def records(self, data):
+        """Registros do bloco que passam nos filtros, do mais novo ao mais antigo"""
+        text = data.decode('utf-8', errors='replace')
+        if self.text and self.text not in text.lower():
+            return []
+        records = []
+        current = None
+        for line in text.splitlines():
+            level = line_level(line)
+            if level is not None or current is None:
+                current = [line[:19] if level else None, level, [line]]
+                records.append(current)
+            else:
+                current[2].append(line)
+        matches = []
+        for stamp, level, lines in reversed(records):
+            if self.levels is not None and level not in self.levels:
+                continue
+            if self.since_key and (stamp is None or stamp < self.since_key):
+                continue
+            if self.until_key and (stamp is None or stamp >= self.until_key):
+                continue
+            record_text = "\n".join(lines)
+            if self.text and self.text not in record_text.lower():
+                continue
+            if self.token and self.token not in extract_tokens(record_text):
+                continue
+            matches.append({'time': stamp, 'level': level, 'text': record_text})
+        return matches
+
+
+def search_logs(log_dir, since=None, until=None, min_level=None, text=None, token=None, limit=200):
+    """Busca registros nos logs (atual e rotacionados), do mais novo ao mais antigo.
+
+    Arquivos com índice só têm lidos/descomprimidos os blocos cujo período, níveis
+    e tokens podem conter resultados; o app.log atual é lido em blocos de ~1MB e
+    comprimidos ainda sem índice são percorridos inteiros.
+    token é uma busca exata por tipo de erro ou URL/host; text é substring.
+    """
+    started = time.perf_counter()
+    limit = max(1, min(int(limit), MAX_SEARCH_MATCHES))
+    level = (min_level or "").strip().upper()[:1]
+    levels = set(LOG_LEVELS[LOG_LEVELS.index(level):]) if level and level in LOG_LEVELS else None
+    token = (token or "").strip().lower() or None
+    search_filter = _SearchFilter(time_key(since), time_key(until), levels,
+                                  (text or "").strip().lower() or None, token)
+
+    matches = []
+    stats = {'files': 0, 'blocks_read': 0, 'blocks_skipped': 0}
+    for log_path in reversed(list_log_files(log_dir, since, until)):
+        if not os.path.basename(log_path).startswith('app.log'):
+            continue
+        index = load_index(log_path)
+        stats['files'] += 1
+
+        if index is None and compression_of(log_path):
+            # Comprimido ainda sem índice: quem indexa é a manutenção dos logs
+            # (LogRotationManager.index_rotated_logs); até lá o arquivo é percorrido inteiro
+            file_matches = []
+            for _, _, data in _iter_blocks(log_path):
+                stats['blocks_read'] += 1
+                file_matches = (search_filter.records(data) + file_matches)[:limit - len(matches)]
+            matches.extend(dict(match, file=os.path.basename(log_path)) for match in file_matches)
+        elif index is None:
+            for data in _iter_plain_blocks_reversed(log_path):
+                stats['blocks_read'] += 1
+                matches.extend(dict(match, file=os.path.basename(log_path)) for match in search_filter.records(data))
+                if len(matches) >= limit:
+                    break
+        else:
+            token_blocks = set(index['tokens'].get(token, [])) if token else None
+            for block_id in range(len(index['blocks']) - 1, -1, -1):
+                block = index['blocks'][block_id]
+                if not search_filter.block_may_match(block, token_blocks, block_id):
+                    stats['blocks_skipped'] += 1
+                    continue
+                stats['blocks_read'] += 1
+                data = read_block(log_path, block, index['compression'])
+                matches.extend(dict(match, file=index['file']) for match in search_filter.records(data))
+                if len(matches) >= limit:
+                    break
+        if len(matches) >= limit:
+            break
+
+    return {
+        'matches': matches[:limit],
+        'truncated': len(matches) >= limit,
+        'stats': dict(stats, elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+    }
@@ -0,0 +1,274 @@
+import glob
+import gzip
+import io
+import os
+import zipfile
+from datetime import datetime, timezone, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOG_LEVELS = "DIWEC"  # debug, info, warning, error, critical (letra gravada pelo formatter)
+
+
+# Arquivos rotacionados comprimidos pelo LogRotationManager (blocos de linhas completas)
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+
+def is_compressed(path):
+    return path.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_log(path):
+    """Abre um log (texto puro, .gz ou .zst) para leitura binária, descomprimindo se preciso"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')  # lê todos os membros em sequência
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Pacote zstandard não instalado para ler {os.path.basename(path)}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+    return open(path, 'rb')
+
+
+def parse_cursor(cursor):
+    """Cursor 'inode:offset' -> (inode, offset); None se ausente ou inválido"""
+    try:
+        inode, offset = str(cursor).split(":", 1)
+        return int(inode), int(offset)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_cursor(inode, offset):
+    return f"{inode}:{offset}"
+
+
+def line_level(line):
+    """Letra do nível ('I', 'E'...) de uma linha '<data> - X - msg'; None para continuações"""
+    parts = line.split(" - ", 2)
+    if len(parts) == 3 and len(parts[1]) == 1 and parts[1] in LOG_LEVELS:
+        return parts[1]
+    return None
+
+
+def _find_rotated(log_file, inode):
+    """Arquivo rotacionado que ainda tem o inode do cursor (app.log.*), se existir"""
+    for path in glob.glob(f"{log_file}.*"):
+        try:
+            if os.stat(path).st_ino == inode:
+                return path
+        except OSError:
+            continue
+    return None
+
+
+def _read_complete_lines(path, offset, max_bytes):
+    """Lê até max_bytes a partir de offset, parando na última quebra de linha.
+       Retorna (texto, bytes consumidos, há mais dados)."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(max_bytes)
+    if not data:
+        return "", 0, False
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        if len(data) < max_bytes:
+            return "", 0, False  # linha ainda sendo escrita
+        end = len(data)  # linha maior que o limite: entrega cortada
+    # Só indica pendência quando o limite de bytes cortou a leitura (não por linha incompleta)
+    return data[:end].decode('utf-8', errors='replace'), end, len(data) == max_bytes and offset + end < size
+
+
+class _LineFilter:
+    """Filtra por nível mínimo e texto; linhas de continuação herdam o nível anterior"""
+
+    def __init__(self, min_level=None, text=None):
+        level = (min_level or "").strip().upper()[:1]
+        self.levels = set(LOG_LEVELS[LOG_LEVELS.index(level):]) if level and level in LOG_LEVELS else None
+        self.text = (text or "").strip().lower() or None
+        self.current_level = None
+
+    def __call__(self, line):
+        level = line_level(line)
+        if level is not None:
+            self.current_level = level
+        if self.levels is not None and self.current_level not in self.levels:
+            return False
+        return self.text is None or self.text in line.lower()
+
+
+def tail_log(log_file, cursor=None, max_bytes=256 * 1024, min_level=None, text=None):
+    """Retorna apenas as linhas novas desde o cursor.
+
+    Sem cursor, devolve o final do arquivo (até max_bytes). Se o arquivo foi
+    rotacionado, termina de ler o arquivo antigo (pelo inode) e continua do
+    início do novo. O cursor sempre avança, mesmo sobre linhas filtradas.
+    """
+    if not os.path.exists(log_file):
+        return None
+
+    stat = os.stat(log_file)
+    position = parse_cursor(cursor) if cursor else None
+    rotated = False
+    chunks = []
+    budget = max_bytes
+    truncated = False
+
+    if position is None:
+        offset = max(0, stat.st_size - max_bytes)
+        if offset:
+            # Começa na primeira linha completa dentro da janela
+            with open(log_file, 'rb') as f:
+                f.seek(offset - 1)
+                offset += len(f.readline()) - 1
+    else:
+        inode, offset = position
+        if inode != stat.st_ino:
+            rotated = True
+            old_file = _find_rotated(log_file, inode)
+            if old_file:
+                text_chunk, consumed, truncated = _read_complete_lines(old_file, offset, budget)
+                if truncated:
+                    # Ainda há conteúdo no arquivo antigo: continua nele na próxima chamada
+                    return _build_result(text_chunk, format_cursor(inode, offset + consumed),
+                                         True, rotated, min_level, text)
+                chunks.append(text_chunk)
+                budget -= consumed
+            offset = 0
+        elif offset > stat.st_size:
+            rotated = True  # arquivo truncado/recriado com o mesmo inode
+            offset = 0
+
+    consumed = 0
+    if budget > 0:
+        text_chunk, consumed, truncated = _read_complete_lines(log_file, offset, budget)
+        chunks.append(text_chunk)
+    else:
+        truncated = offset < stat.st_size
+
+    return _build_result("".join(chunks), format_cursor(stat.st_ino, offset + consumed),
+                         truncated, rotated, min_level, text)
+
+
+def _build_result(content, cursor, truncated, rotated, min_level, text):
+    line_filter = _LineFilter(min_level, text)
+    lines = [line for line in content.splitlines() if line_filter(line)]
+    return {
+        'lines': lines,
+        'cursor': cursor,
+        'truncated': truncated,
+        'rotated': rotated
+    }
+
+
+LOG_TIMEZONE = timezone(timedelta(hours=-3))  # mesmo fuso do GMT3Formatter
+
+
+def parse_log_time(value, end_of_day=False):
+    """Converte 'YYYY-MM-DD[ HH:MM[:SS]]' (GMT-3) ou epoch em timestamp; None se vazio.
+       end_of_day: uma data sem hora vale o fim do dia (meia-noite do dia seguinte),
+       para limites exclusivos como until"""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            moment = datetime.strptime(value, fmt).replace(tzinfo=LOG_TIMEZONE)
+        except ValueError:
+            continue
+        if end_of_day and fmt == "%Y-%m-%d":
+            moment += timedelta(days=1)
+        return moment.timestamp()
+    raise ValueError(f"Data inválida: {value}")
+
+
+def _first_line_time(path):
+    """Timestamp da primeira linha do arquivo (None se não for possível identificar)"""
+    try:
+        with open_log(path) as f:
+            head = f.read(19).decode('utf-8', errors='replace')
+        return datetime.strptime(head, "%Y-%m-%d %H:%M:%S").replace(tzinfo=LOG_TIMEZONE).timestamp()
+    except (OSError, ValueError, EOFError, RuntimeError):
+        return None
+
+
+def list_log_files(log_dir, since=None, until=None):
+    """Arquivos *.log e arquivos rotacionados (*.log.*, inclusive .gz/.zst) cujo período cruza
+       [since, until]. O período vai da primeira linha do arquivo até sua última modificação."""
+    paths = set(glob.glob(os.path.join(log_dir, "*.log")) + glob.glob(os.path.join(log_dir, "*.log.*")))
+    selected = []
+    for path in paths:
+        if path.endswith('.tmp') or not os.path.isfile(path):
+            continue  # compressão em andamento
+        modified = os.path.getmtime(path)
+        if since is not None and modified < since:
+            continue
+        if until is not None:
+            started = _first_line_time(path)
+            if started is not None and started > until:
+                continue
+        selected.append((modified, path))
+    return [path for _, path in sorted(selected)]
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Destino não-seekable para o zipfile; acumula bytes até serem consumidos"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(paths, chunk_size=256 * 1024, compresslevel=1):
+    """Gera um zip em pedaços, comprimindo cada arquivo conforme o cliente lê.
+       A memória usada fica em torno de chunk_size, independente do tamanho dos logs.
+       Arquivos .gz/.zst entram descomprimidos, com o nome original."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+        for path in paths:
+            try:
+                source = open_log(path)
+            except (OSError, RuntimeError):
+                continue  # removido pela limpeza/rotação no meio do download
+            arcname = os.path.basename(path)
+            if is_compressed(arcname):
+                arcname = os.path.splitext(arcname)[0]
+            with source:
+                info = zipfile.ZipInfo.from_file(path, arcname=arcname)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with zf.open(info, 'w', force_zip64=True) as entry:
+                    while True:
+                        data = source.read(chunk_size)
+                        if not data:
+                            break
+                        entry.write(data)
+                        pending = buffer.drain()
+                        if pending:
+                            yield pending
+            pending = buffer.drain()
+            if pending:
+                yield pending
+    yield buffer.drain()
@@ -1,12 +1,25 @@
 import logging
 import os
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler, QueueHandler, QueueListener
 from concurrent_log_handler import ConcurrentRotatingFileHandler
+import portalocker
 from datetime import datetime, timezone, timedelta
 import threading
 import time
 import glob
 import atexit
+import itertools
+import fcntl
+import gzip
+import zlib
+from log_reader import is_compressed
+from log_index import LogIndexBuilder, build_index, index_path, remove_orphan_indexes
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 class GMT3Formatter(logging.Formatter):
     def converter(self, timestamp):
@@ -37,81 +50,331 @@ class CustomTimedRotatingFileHandler(TimedRotatingFileHandler):
         
         return super().computeRollover(currentTime)
 
+# Retenção dos logs rotacionados: cota total em bytes + idade máxima.
+# Arquivos app.log.* fechados são comprimidos em segundo plano (zstd se o pacote
+# estiver instalado, senão gzip), fora do caminho de escrita do log.
+LOG_RETENTION_BYTES = int(float(os.getenv('LOG_RETENTION_MB', '500')) * 1024 * 1024)
+LOG_RETENTION_DAYS = float(os.getenv('LOG_RETENTION_DAYS', '14'))
+LOG_COMPRESSION = os.getenv('LOG_COMPRESSION', 'auto').lower()  # auto, zstd, gzip, none
+LOG_MAINTENANCE_INTERVAL = int(os.getenv('LOG_MAINTENANCE_INTERVAL', '300'))
+COMPRESS_MIN_AGE = 60  # segundos sem escrita antes de comprimir (outros processos podem ainda ter o arquivo aberto)
+COMPRESS_BLOCK_SIZE = 1024 * 1024  # cada bloco (membro gzip / frame zstd) termina numa quebra de linha
+
+
 class LogRotationManager:
-    def __init__(self, log_dir='logs', max_log_files=50):
+    def __init__(self, log_dir='logs', max_bytes=LOG_RETENTION_BYTES, max_age_days=LOG_RETENTION_DAYS,
+                 compression=LOG_COMPRESSION, interval=LOG_MAINTENANCE_INTERVAL):
         self.log_dir = log_dir
-        self.max_log_files = max_log_files
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.compression = compression
+        self.interval = interval
         self.cleanup_thread = None
-        self.running = False
-    
+        self.stop_event = threading.Event()
+
     def start_cleanup_monitor(self):
         if self.cleanup_thread and self.cleanup_thread.is_alive():
             return
-        
-        self.running = True
-        self.cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
+
+        self.stop_event.clear()
+        self.cleanup_thread = threading.Thread(target=self._cleanup_loop, name="log-maintenance", daemon=True)
         self.cleanup_thread.start()
-        
+
         logger = logging.getLogger('marketroxo')
-        logger.info(f"🧹 Monitor de limpeza de logs iniciado (máx: {self.max_log_files} arquivos)")
-    
+        logger.info(f"🧹 Monitor de limpeza de logs iniciado (cota: {self.max_bytes // (1024 * 1024)}MB, "
+                    f"idade máx: {self.max_age_days:g} dias, compressão: {self._compression_method() or 'desativada'})")
+
     def stop_cleanup_monitor(self):
-        self.running = False
+        self.stop_event.set()
         if self.cleanup_thread:
             self.cleanup_thread.join(timeout=1)
-    
+
     def _cleanup_loop(self):
-        while self.running:
+        while True:
             try:
-                self.cleanup_old_logs()
-                time.sleep(3600)
+                self.run_maintenance()
+                wait = self.interval
             except Exception as e:
                 logger = logging.getLogger('marketroxo')
                 logger.error(f"Erro no monitor de limpeza: {e}")
-                time.sleep(300)
-    
+                wait = max(self.interval, 300)
+            if self.stop_event.wait(timeout=wait):
+                return
+
+    def run_maintenance(self):
+        """Comprime os rotacionados e aplica a retenção; só um processo por vez (flock)"""
+        if not os.path.exists(self.log_dir):
+            return
+        with open(os.path.join(self.log_dir, '.maintenance.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # outro worker/daemon já está cuidando disso
+            self.compress_rotated_logs()
+            self.cleanup_old_logs()
+            self.index_rotated_logs()
+
+    def _compression_method(self):
+        if self.compression in ('none', 'off', '0'):
+            return None
+        if self.compression in ('auto', 'zstd') and zstandard is not None:
+            return 'zstd'
+        return 'gzip'
+
+    def _rotated_logs(self):
+        """(caminho, stat) dos app.log.* já rotacionados, numa única listagem do diretório"""
+        rotated = []
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('app.log.') and not entry.name.endswith('.tmp') and entry.is_file():
+                    rotated.append((entry.path, entry.stat()))
+        return rotated
+
+    def compress_rotated_logs(self):
+        method = self._compression_method()
+        if method is None:
+            return 0
+        now = time.time()
+        compressed = 0
+        for path, stat in self._rotated_logs():
+            if is_compressed(path) or now - stat.st_mtime < COMPRESS_MIN_AGE:
+                continue
+            if self.stop_event.is_set():
+                break
+            try:
+                if self._is_numbered(path):
+                    path, stat = self._claim_numbered_log(path)
+                    if now - stat.st_mtime < COMPRESS_MIN_AGE:
+                        continue  # foi rotacionado de novo antes do rename; fica para a próxima rodada
+                self.compress_log_file(path, stat, method)
+                compressed += 1
+            except FileNotFoundError:
+                continue  # saiu da rotação (backupCount) entre a listagem e o rename
+            except OSError as e:
+                logging.getLogger('marketroxo').error(f"Erro ao comprimir {path}: {e}")
+        return compressed
+
+    @staticmethod
+    def _is_numbered(path):
+        return path.rsplit('.', 1)[-1].isdigit()
+
+    def _claim_numbered_log(self, path):
+        """Sufixos numéricos (app.log.1) são renomeados pelo handler por tamanho a cada rotação.
+           Sob o mesmo lock que ele usa para rotacionar, o arquivo ganha um nome com o horário
+           da última escrita, que o handler não toca mais; a compressão parte desse nome."""
+        _, lock_name = ConcurrentRotatingFileHandler.baseLockFilename(os.path.join(self.log_dir, 'app.log'))
+        with open(os.path.join(self.log_dir, lock_name), 'a') as lock_file:
+            portalocker.lock(lock_file, portalocker.LOCK_EX)
+            try:
+                stat = os.stat(path)
+                stamp = datetime.fromtimestamp(stat.st_mtime, timezone(timedelta(hours=-3))).strftime("%Y-%m-%d_%H-%M-%S")
+                base = target = os.path.join(self.log_dir, f"app.log.{stamp}")
+                counter = 1
+                while os.path.exists(target):
+                    target = f"{base}-{counter}"
+                    counter += 1
+                os.rename(path, target)
+            finally:
+                portalocker.unlock(lock_file)
+        return target, os.stat(target)
+
+    def compress_log_file(self, path, stat, method):
+        """Comprime em blocos independentes de linhas completas e troca o original atomicamente.
+           path não pode ser um app.log.N (ver _claim_numbered_log)."""
+        extension = '.zst' if method == 'zstd' else '.gz'
+        base = path
+        target = base + extension
+        counter = 1
+        while os.path.exists(target):
+            target = f"{base}-{counter}{extension}"
+            counter += 1
+        tmp_file = target + '.tmp'
+        compressor = zstandard.ZstdCompressor(level=3) if method == 'zstd' else None
+        # O índice de busca (log_index) é montado junto, bloco a bloco, sem reler o arquivo
+        index = LogIndexBuilder(method)
+
+        try:
+            with open(path, 'rb') as source, open(tmp_file, 'wb') as output:
+                while True:
+                    block = source.read(COMPRESS_BLOCK_SIZE)
+                    if not block:
+                        break
+                    block += source.readline()
+                    if compressor is not None:
+                        compressed_block = compressor.compress(block)
+                    else:
+                        compressed_block = gzip.compress(block, compresslevel=6, mtime=0)
+                    index.add_block(output.tell(), len(compressed_block), block)
+                    output.write(compressed_block)
+                output.flush()
+                os.fsync(output.fileno())
+            # Mantém o horário da última escrita (usado no filtro por período do download)
+            os.utime(tmp_file, (stat.st_atime, stat.st_mtime))
+            os.replace(tmp_file, target)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        os.remove(path)
+        index.save(target)
+        return target
+
+    def index_rotated_logs(self):
+        """Indexa rotacionados ainda sem índice (comprimidos antes do índice existir ou
+           com compressão desativada) e remove índices de arquivos já apagados"""
+        now = time.time()
+        for path, stat in self._rotated_logs():
+            if self.stop_event.is_set():
+                break
+            if os.path.exists(index_path(path)):
+                continue
+            if not is_compressed(path) and now - stat.st_mtime < COMPRESS_MIN_AGE:
+                continue
+            try:
+                build_index(path)
+            except (OSError, RuntimeError, EOFError, zlib.error) as e:
+                logging.getLogger('marketroxo').error(f"Erro ao indexar {path}: {e}")
+        remove_orphan_indexes(self.log_dir)
+
     def cleanup_old_logs(self):
+        """Remove rotacionados mais velhos que max_age_days e, do mais antigo ao mais novo,
+           até o total (incluindo o app.log atual) caber em max_bytes"""
         try:
             if not os.path.exists(self.log_dir):
                 return
-            
-            log_pattern = os.path.join(self.log_dir, "app.log*")
-            log_files = glob.glob(log_pattern)
-            
-            if len(log_files) <= self.max_log_files:
-                return
-            
-            log_files.sort(key=os.path.getmtime)
-            
-            files_to_remove = len(log_files) - self.max_log_files
+
+            rotated = sorted(self._rotated_logs(), key=lambda item: item[1].st_mtime)
+            active_path = os.path.join(self.log_dir, 'app.log')
+            total = sum(stat.st_size for _, stat in rotated)
+            if os.path.exists(active_path):
+                total += os.path.getsize(active_path)
+            oldest_allowed = time.time() - self.max_age_days * 86400
+
             removed_count = 0
-            
-            for log_file in log_files[:files_to_remove]:
+            freed = 0
+            for log_file, stat in rotated:
+                if stat.st_mtime >= oldest_allowed and total <= self.max_bytes:
+                    break
                 try:
-                    if log_file.endswith('app.log') and not any(c.isdigit() for c in log_file.split('.')[-1]):
-                        continue
-                    
                     os.remove(log_file)
                     removed_count += 1
+                    freed += stat.st_size
+                    total -= stat.st_size
                 except OSError:
                     pass
-            
+
             if removed_count > 0:
                 logger = logging.getLogger('marketroxo')
-                logger.info(f"🧹 Removidos {removed_count} arquivos de log antigos")
-        
+                logger.info(f"🧹 Removidos {removed_count} arquivos de log antigos ({freed / (1024 * 1024):.1f}MB liberados)")
+
         except Exception as e:
             logger = logging.getLogger('marketroxo')
             logger.error(f"Erro na limpeza de logs: {e}")
 
 _rotation_manager = LogRotationManager()
 
+
+# --- Logging assíncrono ---
+# O logger só enfileira o registro; uma thread (QueueListener) faz o I/O no arquivo.
+# Com a fila cheia, registros abaixo de WARNING são descartados e avisos/erros
+# substituem o registro mais antigo: quem loga nunca espera pelo disco.
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler com fila limitada que descarta em vez de bloquear"""
+
+    # Total do processo (não zera quando o handler é recriado na rotação)
+    dropped = 0
+
+    def prepare(self, record):
+        # Mensagens de log_event são formatadas só na thread de escrita
+        if isinstance(record.msg, LazyMessage) and not record.exc_info:
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        DroppingQueueHandler.dropped += 1
+        if record.levelno < logging.WARNING:
+            return
+        try:
+            self.queue.get_nowait()  # abre espaço descartando o registro mais antigo
+            self.queue.put_nowait(record)
+        except (queue.Empty, queue.Full):
+            pass
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener que, ao parar, processa o que ainda está na fila"""
+
+    def enqueue_sentinel(self):
+        # A fila pode estar cheia: espera um pouco em vez de perder o sinal de parada
+        self.queue.put(self._sentinel, timeout=5)
+
+
+_queue_listener = None
+_queue_handler = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _stop_queue_listener():
+    """Esvazia a fila, para a thread de escrita e fecha os handlers de arquivo"""
+    global _queue_listener, _queue_handler, _listener_pid
+    with _listener_lock:
+        listener = _queue_listener
+        _queue_listener = None
+        _queue_handler = None
+        if listener is None:
+            return
+        # Após um fork a thread não existe no filho: só descarta as referências
+        if _listener_pid == os.getpid() and listener._thread is not None:
+            try:
+                listener.stop()
+            except queue.Full:
+                pass
+        for handler in listener.handlers:
+            try:
+                handler.flush()
+                handler.close()
+            except Exception:
+                pass
+
+
+def _attach_queue_handler(logger, handler):
+    """Liga o handler de arquivo ao logger através da fila + thread de escrita"""
+    global _queue_listener, _queue_handler, _listener_pid
+    _stop_queue_listener()
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = FlushingQueueListener(log_queue, handler, respect_handler_level=True)
+    with _listener_lock:
+        listener.start()
+        _queue_listener = listener
+        _queue_handler = queue_handler
+        _listener_pid = os.getpid()
+    logger.addHandler(queue_handler)
+
+
+def get_log_queue_stats():
+    """Profundidade da fila de logs e total de registros descartados neste processo"""
+    handler = _queue_handler
+    depth = handler.queue.qsize() if handler is not None else 0
+    return {'queue_depth': depth, 'queue_size': LOG_QUEUE_SIZE, 'dropped': DroppingQueueHandler.dropped}
+
+
 def setup_logging(rotation_type='size', rotation_interval=4):
     logger = logging.getLogger('marketroxo')
     logger.setLevel(logging.INFO)
 
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+    _stop_queue_listener()
 
     is_test_mode = os.getenv('TEST_MODE', '0') == '1'
 
@@ -150,7 +413,10 @@ def setup_logging(rotation_type='size', rotation_interval=4):
         formatter = GMT3Formatter('%(asctime)s - %(levelname).1s - %(message)s')
 
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    if is_test_mode:
+        logger.addHandler(handler)
+    else:
+        _attach_queue_handler(logger, handler)
 
 def setup_frequent_rotation():
     setup_logging(rotation_type='size', rotation_interval=10)
@@ -162,47 +428,58 @@ def setup_4hour_rotation():
     """Setup 4-hour log rotation with process-safe handling"""
     setup_logging(rotation_type='time', rotation_interval=4)
 
-# Cache do logger para evitar overhead
+# Cache do logger para evitar overhead.
+# A rotação forçada incrementa uma geração num slot de memória compartilhada
+# (shared_state.SharedSlot); cada processo compara com a geração que já aplicou.
+# No caminho comum get_logger() é só leitura de memória, sem chamadas de sistema.
 _logger_cache = None
-_last_check = 0
+_logger_generation = None
+_generation_slot = None
+_generation_view = None
+
+
+def _rotation_generation_slot():
+    global _generation_slot, _generation_view
+    if _generation_slot is None:
+        # Import tardio: shared_state importa get_logger deste módulo
+        from shared_state import SharedSlot
+        _generation_slot = SharedSlot("log_generation.shm", size=4096)
+        _generation_view = _generation_slot.raw_sequence_view()
+    return _generation_slot
+
 
 def get_logger():
     """Retorna o logger configurado, reinicializando apenas se necessário."""
-    global _logger_cache, _last_check
-    import time
-    
-    current_time = time.time()
-    
-    # Só verifica rotação a cada 5 segundos para evitar overhead
-    if _logger_cache and (current_time - _last_check) < 5:
-        return _logger_cache
-    
-    _last_check = current_time
+    logger = _logger_cache
+    if logger is not None and _generation_view is not None and _generation_view[0] == _logger_generation:
+        return logger
+    return _refresh_logger()
+
+
+def _refresh_logger():
+    """Configura o logger na primeira chamada e reaplica a configuração após rotação"""
+    global _logger_cache, _logger_generation
     logger = logging.getLogger('marketroxo')
-    signal_file = os.path.join('logs', 'rotation_signal')
-    
-    # Verifica se precisa reinicializar após rotação
-    if os.path.exists(signal_file):
+    try:
+        _rotation_generation_slot()
+        generation = _generation_view[0]
+    except Exception as e:
+        print(f"Erro ao ler geração do log: {e}")
+        generation = None
+
+    # Outro processo rotacionou o log: reabre o app.log novo
+    if _logger_cache is not None and generation != _logger_generation:
         try:
-            with open(signal_file, 'r') as f:
-                timestamp = f.read().strip()
-            os.remove(signal_file)
-            
-            # Remove handlers antigos
             for handler in logger.handlers[:]:
                 handler.flush()
                 handler.close()
                 logger.removeHandler(handler)
-            
-            # Reconfigura logging completamente
+            _stop_queue_listener()
             setup_4hour_rotation()
-            logger.info(f"🔄 Logger reinicializado após rotação ({timestamp}) - PID: {os.getpid()}")
-            _logger_cache = logger
-            return logger
-            
+            logger.info(f"🔄 Logger reinicializado após rotação (geração {generation}) - PID: {os.getpid()}")
         except Exception as e:
             print(f"Erro ao reinicializar logger: {e}")
-    
+
     # Se não tem handlers, configura automaticamente
     if not logger.handlers:
         logger.setLevel(logging.INFO)
@@ -230,13 +507,22 @@ def get_logger():
                 use_gzip=False
             )
             handler.setFormatter(GMT3Formatter('%(asctime)s - %(levelname).1s - %(message)s'))
-            logger.addHandler(handler)
+            _attach_queue_handler(logger, handler)
         
         logger.info(f"🔧 Logger configurado automaticamente - PID: {os.getpid()}")
     
+    _logger_generation = generation
     _logger_cache = logger
     return logger
 
+
+def _publish_rotation(timestamp):
+    """Avisa todos os processos (workers, daemon) que o app.log foi trocado"""
+    global _logger_generation
+    _rotation_generation_slot().write(timestamp.encode('utf-8'))
+    # Este processo já está com o handler novo
+    _logger_generation = _generation_view[0]
+
 def force_log_rotation():
     """Força a rotação do log atual, arquivando com timestamp."""
     logger = logging.getLogger('marketroxo')
@@ -260,6 +546,8 @@ def force_log_rotation():
             logger.removeHandler(handler)
         except Exception as e:
             logger.error(f"Erro ao fechar handler: {e}")
+    # Grava o que ainda está na fila antes de renomear o arquivo
+    _stop_queue_listener()
     
     try:
         if os.path.exists(log_file_path):
@@ -288,23 +576,12 @@ def force_log_rotation():
             encoding='utf-8'
         )
         new_handler.setFormatter(GMT3Formatter('%(asctime)s - %(levelname).1s - %(message)s'))
-        logger.addHandler(new_handler)
+        _attach_queue_handler(logger, new_handler)
         logger.info("🔄 Novo handler de log configurado após rotação")
         
-        # Cria sinal de rotação para notificar todos os workers
-        signal_file = os.path.join('logs', 'rotation_signal')
-        with open(signal_file, 'w') as f:
-            f.write(timestamp)
-        
-        # Força todos os workers a recarregar handlers na próxima chamada get_logger()
-        import signal
-        import subprocess
-        try:
-            # Envia SIGUSR1 para todos os workers do gunicorn para forçar reload
-            subprocess.run(['pkill', '-SIGUSR1', '-f', 'gunicorn'], check=False)
-            logger.info("📢 Sinal de rotação enviado para todos os workers")
-        except Exception as e:
-            logger.warning(f"Aviso: não foi possível sinalizar workers: {e}")
+        # Incrementa a geração compartilhada; os outros processos reabrem o arquivo no próximo log
+        _publish_rotation(timestamp)
+        logger.info("📢 Rotação publicada para todos os processos")
         
         return rotated
     except Exception as e:
@@ -320,6 +597,62 @@ def force_log_rotation():
 def cleanup_on_exit():
     global _rotation_manager
     _rotation_manager.stop_cleanup_monitor()
+    # Garante que os registros ainda na fila cheguem ao arquivo
+    _stop_queue_listener()
+
+# --- Logging estruturado e preguiçoso ---
+# log_event recebe um template + campos e só formata quando um handler grava o
+# registro; campos "chamáveis" (ex.: link.prettify) só são avaliados nesse momento.
+# Nada é montado se o nível estiver desativado ou se a amostragem descartar.
+
+
+class LazyMessage:
+    """Template str.format + campos, renderizado apenas no str()"""
+
+    __slots__ = ('template', 'fields', 'sample')
+
+    def __init__(self, template, fields, sample=None):
+        self.template = template
+        self.fields = fields
+        self.sample = sample
+
+    def __str__(self):
+        values = {key: value() if callable(value) else value for key, value in self.fields.items()}
+        message = self.template.format(**values)
+        if self.sample:
+            every, total = self.sample
+            message += f" [amostra 1/{every}, {total} ocorrências]"
+        return message
+
+
+class LogSampler:
+    """Amostragem por ponto de chamada: deixa passar 1 a cada `every` eventos"""
+
+    def __init__(self, every):
+        self.every = max(1, int(every))
+        self._counter = itertools.count(1)  # next() é atômico no CPython
+
+    def hit(self):
+        """Total de ocorrências se este evento deve ser registrado; None se descartado"""
+        total = next(self._counter)
+        return total if total % self.every == 1 or self.every == 1 else None
+
+
+def log_event(level, template, sampler=None, **fields):
+    """Registra template.format(**fields) sem formatar nada se o nível estiver desligado.
+       Os campos também ficam em record.fields para handlers estruturados."""
+    logger = get_logger()
+    if not logger.isEnabledFor(level):
+        return False
+    sample = None
+    if sampler is not None:
+        total = sampler.hit()
+        if total is None:
+            return False
+        sample = (sampler.every, total) if sampler.every > 1 else None
+    logger.log(level, LazyMessage(template, fields, sample), extra={'fields': fields})
+    return True
+
 
 def log_debug(message):
     get_logger().debug(message)
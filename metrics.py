@@ -0,0 +1,330 @@
+import os
+import threading
+try:
+    import psutil
+except ImportError:
+    psutil = None
+from logging_config import get_logger, get_log_queue_stats
+from request_stats import LATENCY_BUCKETS
+from shared_state import SharedSlot
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _format_value(value):
+    # OpenMetrics só aceita NaN, +Inf e -Inf (repr do Python daria nan/inf)
+    if isinstance(value, float) and value != value:
+        return "NaN"
+    if value == float('inf'):
+        return "+Inf"
+    if value == float('-inf'):
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + escaped + "}"
+
+
+class _Metric:
+    """Base para métricas com labels; filhos são criados sob demanda"""
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labelvalues):
+        key = tuple(str(labelvalues[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# TYPE {self.name} {self.TYPE}", f"# HELP {self.name} {self.documentation}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        """Para totais amostrados de fora (ex.: CPU acumulada do processo)"""
+        self.value = value
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def _samples(self):
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in list(self._children.items())]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Valor calculado na hora da renderização (fora do caminho das requisições)"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class Gauge(_Metric):
+    TYPE = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+                for key, child in list(self._children.items())]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def _samples(self):
+        samples = []
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_count{labels} {child.count}")
+            samples.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        return samples
+
+
+class MetricsRegistry:
+    """Registro de métricas do processo, renderizado no formato OpenMetrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+_metrics_slot = SharedSlot("metrics.shm")
+
+# --- Scraper ---
+SCRAPE_REQUESTS = REGISTRY.counter(
+    "marketroxo_scrape_requests", "Requests ao marketplace por status e proxy", ["status", "proxy"])
+FETCH_DURATION = REGISTRY.histogram(
+    "marketroxo_fetch_duration_seconds", "Tempo para obter uma página do marketplace")
+PARSE_DURATION = REGISTRY.histogram(
+    "marketroxo_parse_duration_seconds", "Tempo de parse e extração de anúncios de uma página")
+
+# --- Monitor ---
+CYCLE_DURATION = REGISTRY.histogram(
+    "marketroxo_cycle_duration_seconds", "Duração de um ciclo completo de monitoramento",
+    buckets=(30, 60, 120, 300, 600, 900, 1800, 3600))
+ADS_FOUND = REGISTRY.counter("marketroxo_ads_found", "Anúncios extraídos das páginas")
+ADS_NEW = REGISTRY.counter("marketroxo_ads_new", "Anúncios ainda não vistos")
+ADS_SENT = REGISTRY.counter("marketroxo_ads_sent", "Anúncios entregues no Telegram")
+SEEN_STORE_SIZE = REGISTRY.gauge("marketroxo_seen_ads", "Hashes de anúncios já vistos")
+MONITOR_RUNNING = REGISTRY.gauge("marketroxo_monitor_running", "1 se o loop de monitoramento está ativo")
+
+# --- Entrega ---
+TELEGRAM_MESSAGES = REGISTRY.counter(
+    "marketroxo_telegram_messages", "Mensagens enviadas ao Telegram por status", ["status"])
+SEND_DURATION = REGISTRY.histogram(
+    "marketroxo_telegram_send_duration_seconds", "Tempo de envio de uma mensagem ao Telegram")
+QUEUE_DEPTH = REGISTRY.gauge("marketroxo_queue_depth", "Itens aguardando em filas internas", ["queue"])
+QUEUE_DEPTH.labels(queue="log").set_function(lambda: get_log_queue_stats()['queue_depth'])
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "marketroxo_log_records_dropped", "Registros de log descartados com a fila de escrita cheia")
+
+# --- Processo ---
+PROCESS_RSS = REGISTRY.gauge("process_resident_memory_bytes", "Memória residente do processo do monitor")
+PROCESS_CPU = REGISTRY.counter("process_cpu_seconds", "Tempo de CPU (user+system) do processo do monitor")
+PROCESS_START = REGISTRY.gauge("process_start_time_seconds", "Início do processo do monitor (epoch)")
+
+
+class MetricsPublisher:
+    """Renderiza as métricas periodicamente e publica no slot compartilhado.
+
+    Roda no processo que executa o monitor; qualquer worker do gunicorn serve
+    /metrics lendo o texto já pronto da memória compartilhada.
+    """
+
+    def __init__(self, registry=REGISTRY, interval=5):
+        self.registry = registry
+        self.interval = interval
+        self.slot = _metrics_slot
+        self.thread = None
+        self.stop_event = threading.Event()
+        self._process = psutil.Process(os.getpid()) if psutil else None
+        if self._process:
+            PROCESS_START.set(self._process.create_time())
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval)
+
+    def _run(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                get_logger().error(f"❌ Erro ao publicar métricas: {str(e)}")
+            if self.stop_event.wait(timeout=self.interval):
+                break
+
+    def _sample_process(self):
+        if not self._process:
+            return
+        cpu = self._process.cpu_times()
+        PROCESS_CPU.set(cpu.user + cpu.system)
+        PROCESS_RSS.set(self._process.memory_info().rss)
+
+    def publish(self):
+        self._sample_process()
+        LOG_RECORDS_DROPPED.set(get_log_queue_stats()['dropped'])
+        self.slot.write(self.registry.render().encode('utf-8'))
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def start_publisher(interval=5):
+    """Inicia (uma vez por processo) a publicação periódica das métricas"""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None or (_publisher._process and _publisher._process.pid != os.getpid()):
+            _publisher = MetricsPublisher(interval=interval)
+        _publisher.start()
+    return _publisher
+
+
+def read_published_metrics():
+    """Texto OpenMetrics publicado pelo processo do monitor (None se não houver)"""
+    return _metrics_slot.read()
+
+
+def render_local_metrics():
+    """Renderiza o registro deste processo (usado quando nada foi publicado)"""
+    return REGISTRY.render().encode('utf-8')
+
+
+def proxy_label(proxies):
+    """Identifica o proxy pelo host:porta, sem credenciais"""
+    if not proxies:
+        return "none"
+    proxy_url = proxies.get("https") or proxies.get("http") or ""
+    if not proxy_url or proxy_url == "None":
+        return "none"
+    return proxy_url.rsplit("@", 1)[-1].split("://", 1)[-1].rstrip("/")
@@ -1,13 +1,22 @@
 import threading
 import time
+from collections import deque
 from datetime import datetime, timezone, timedelta
 import random
 import hashlib
+import math
 import os
 from emoji_sorter import get_random_emoji
 from itertools import combinations
 from logging_config import get_logger
 from request_stats import RequestStats
+from keyword_allocator import KeywordSetAllocator
+from keyword_scheduler import KeywordSetScheduler
+from ad_store import AdStore
+from metrics import (ADS_FOUND, ADS_NEW, ADS_SENT, CYCLE_DURATION, MONITOR_RUNNING,
+                     SEEN_STORE_SIZE, start_publisher)
+from shared_state import MONITOR_STATE, StatePublisher
+from tracing import span
 
 
 class Monitor:
@@ -16,14 +25,17 @@ class Monitor:
                  scraper, telegram_bot,
                  chat_id, hash_file=None,
                  monitoring_interval=30,
-                 batch_size=1, page_depth=3,
+                 batch_size=0, page_depth=3,
                  number_set=4,
                  retry_attempts=100, min_repeat_time=17,
                  max_repeat_time=65,
                  allow_subset=False,
                  min_subset_size=2, max_subset_size=None,
                  stats_file=None, max_history=1000,
-                 send_as_batch=True
+                 send_as_batch=True,
+                 ad_store=None,
+                 adaptive_subsets=True,
+                 min_monitoring_interval=None, max_monitoring_interval=None
                  ):
         self.keywords = keywords
         self.negative_keywords_list = negative_keywords_list
@@ -31,15 +43,35 @@ class Monitor:
         self.scraper = scraper
         self.telegram_bot = telegram_bot
         self.chat_id = chat_id
+        self.chat_ids = self._parse_recipients(chat_id)
         # Logger como property para sempre obter instância atualizada
         self.is_running = False
         self.stop_event = threading.Event()
         self.monitoring_interval = monitoring_interval
+        # Limites (minutos) do intervalo adaptativo de cada conjunto; None = metade / 4x o intervalo
+        self.min_monitoring_interval = min_monitoring_interval
+        self.max_monitoring_interval = max_monitoring_interval
+        self.scheduler = KeywordSetScheduler(*self._interval_bounds())
+        # Acorda a espera entre ciclos (parada ou nova configuração)
+        self.wake_event = threading.Event()
+        # Orçamento de páginas por intervalo base (ver _page_budget): (horário, páginas) de cada ciclo
+        self.budget_spends = deque()
+        self._budget_lock = threading.Lock()  # o estado publicado também lê o orçamento
         self.thread = None
         
         # Inicializa sistema de estatísticas
         self.stats = RequestStats(stats_file=stats_file, max_history=max_history)
 
+        # Arquivo consultável dos anúncios entregues (/ads)
+        self.ad_store = ad_store if ad_store is not None else AdStore()
+
+        # Estatísticas e status publicados em memória compartilhada para todos os workers
+        self.cycle_count = 0
+        self.last_cycle_duration = None
+        self.state_publisher = StatePublisher(
+            MONITOR_STATE, self._state_snapshot, version_fn=lambda: self.stats.version
+        )
+
         # Use home directory for the hash file if not specified
         if hash_file is None:
             data_dir = os.path.join(os.path.expanduser("~"), ".marketroxo_data")
@@ -51,6 +83,7 @@ class Monitor:
 
         self.batch_size = batch_size
         self.seen_ads = self._load_seen_ads()
+        SEEN_STORE_SIZE.set_function(lambda: len(self.seen_ads))
 
         self.send_as_batch = send_as_batch
 
@@ -63,17 +96,103 @@ class Monitor:
         self.min_subset_size = min_subset_size
         self.max_subset_size = max_subset_size
         self.allow_subset = allow_subset
+        # Com subconjuntos, distribui number_set * page_depth páginas pelo rendimento observado
+        self.adaptive_subsets = adaptive_subsets
+        self.allocator = KeywordSetAllocator()
         self.logger.info(f"👹 Allowing keyword subsets: {self.allow_subset} (min: {self.min_subset_size}, max: {self.max_subset_size})")
 
+    # Campos que podem ser trocados com o monitor rodando (lidos a cada ciclo/página)
+    HOT_CONFIG_FIELDS = (
+        'keywords', 'negative_keywords_list', 'positive_keywords_list', 'telegram_bot', 'chat_id',
+        'batch_size', 'number_set', 'monitoring_interval', 'page_depth', 'retry_attempts',
+        'min_repeat_time', 'max_repeat_time', 'allow_subset', 'send_as_batch',
+        'min_subset_size', 'max_subset_size', 'adaptive_subsets',
+        'min_monitoring_interval', 'max_monitoring_interval'
+    )
+
+    def apply_config(self, **settings):
+        """Atualiza a configuração sem reiniciar; scraper e sessões continuam aquecidos.
+           Vale a partir da próxima página/ciclo. Retorna os campos alterados."""
+        unknown = set(settings) - set(self.HOT_CONFIG_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos não suportados: {', '.join(sorted(unknown))}")
+
+        changed = [field for field, value in settings.items() if getattr(self, field) != value]
+        previous_bot = self.telegram_bot
+        for field in changed:
+            setattr(self, field, settings[field])
+        if 'telegram_bot' in changed and previous_bot is not None:
+            # Token trocado: o bot antigo não é mais usado; libera sessão e executor dele
+            previous_bot.close()
+        if 'chat_id' in changed:
+            self.chat_ids = self._parse_recipients(self.chat_id)
+        if changed:
+            self.scheduler.configure(*self._interval_bounds())
+            self.wake_event.set()
+
+        if changed:
+            self.logger.info(f"♻️ Configuração aplicada sem reiniciar: {', '.join(changed)}")
+        else:
+            self.logger.info("♻️ Configuração recebida sem alterações")
+        return changed
+
+    def _interval_bounds(self):
+        """(base, mínimo, máximo) em segundos para o agendador dos conjuntos"""
+        base = self.monitoring_interval * 60
+        min_interval = self.min_monitoring_interval * 60 if self.min_monitoring_interval else base / 2
+        max_interval = self.max_monitoring_interval * 60 if self.max_monitoring_interval else base * 4
+        return base, min_interval, max_interval
+
     @property
     def logger(self):
         """Property que sempre retorna o logger atualizado"""
         return get_logger()
 
+    @staticmethod
+    def _parse_recipients(chat_id):
+        """Aceita um destinatário, uma lista ou uma string separada por vírgulas"""
+        if isinstance(chat_id, (list, tuple, set)):
+            recipients = [str(c).strip() for c in chat_id]
+        else:
+            recipients = str(chat_id).split(",")
+        return [c.strip() for c in recipients if c.strip()]
+
+    def _deliver_message(self, msg):
+        """Envia a mensagem para todos os destinatários em paralelo.
+           Retorna True se ao menos um chat recebeu a mensagem."""
+        results = self.telegram_bot.broadcast_message(self.chat_ids, msg)
+        delivered = [chat for chat, result in results.items() if result["ok"]]
+        for chat, result in results.items():
+            if not result["ok"]:
+                self.logger.error(f"❌ Falha ao entregar mensagem para {chat}: {result['error']}")
+        if not delivered:
+            raise Exception("Nenhum destinatário recebeu a mensagem")
+        if len(self.chat_ids) > 1:
+            self.logger.info(f"📬 Mensagem entregue para {len(delivered)}/{len(self.chat_ids)} destinatários")
+        return True
+
     def get_health_stats(self):
         """Retorna estatísticas para endpoint /health"""
         return self.stats.get_stats_summary()
 
+    def _state_snapshot(self):
+        """Estatísticas + status de execução, publicados para os outros processos"""
+        state = self.get_health_stats()
+        state['monitor_status'] = {
+            'is_running': self.is_running,
+            'thread_alive': self.thread.is_alive() if self.thread else self.is_running,
+            'pid': os.getpid(),
+            'cycle_count': self.cycle_count,
+            'last_cycle_duration': self.last_cycle_duration,
+            'schedule': self.scheduler.snapshot(),
+            'page_budget': dict(zip(('remaining', 'refill_at'), self._remaining_page_budget()),
+                                total=self._page_budget()),
+            'allocation': [
+                dict(entry, keywords=", ".join(entry['keywords'])) for entry in self.allocator.last_plan
+            ] if self.allow_subset and self.adaptive_subsets else None
+        }
+        return state
+
     def _hash_ad(self, ad):
         return hashlib.sha256(ad['url'].encode('utf-8')).hexdigest()
 
@@ -160,20 +279,80 @@ class Monitor:
         
         return True
 
-    def _select_keyword_sets(self):
-        """Seleciona os conjuntos de palavras-chave para usar no ciclo atual"""
-        selected_keyword_sets = [tuple(self.keywords)]
-        
+    def _keyword_set_candidates(self):
+        """Todos os conjuntos de palavras-chave consultáveis com a configuração atual"""
         if self.allow_subset:
             all_keyword_subsets = self._generate_keyword_subsets()
-            if not all_keyword_subsets:
-                self.logger.warning("⚠️ Nenhuma combinação de subconjunto gerada com as configurações atuais. Usando palavras-chave originais como fallback.")
-                selected_keyword_sets = [tuple(self.keywords)]
-            else:
-                num_sets_to_use = min(self.number_set, len(all_keyword_subsets))
-                selected_keyword_sets = random.sample(all_keyword_subsets, num_sets_to_use)
-                self.logger.info(f"🎲 Selecionados {num_sets_to_use} subconjuntos de palavras-chave para esta verificação.")
+            if all_keyword_subsets:
+                return all_keyword_subsets
+            self.logger.warning("⚠️ Nenhuma combinação de subconjunto gerada com as configurações atuais. Usando palavras-chave originais como fallback.")
+        return [tuple(self.keywords)]
+
+    def _select_keyword_sets(self):
+        """Seleciona, entre os conjuntos vencidos no agendador, os do ciclo atual: [(conjunto, páginas)]"""
+        candidates = self._keyword_set_candidates()
+        due_keyword_sets = self.scheduler.due(candidates)
+        budget, _ = self._remaining_page_budget()
         
+        if not due_keyword_sets or budget <= 0:
+            selected_keyword_sets = []
+        elif not self.allow_subset or len(candidates) == 1:
+            selected_keyword_sets = [(due_keyword_sets[0], min(self.page_depth, budget))]
+        elif self.adaptive_subsets:
+            selected_keyword_sets = self._allocate_keyword_sets(due_keyword_sets, budget)
+        else:
+            num_sets_to_use = min(self.number_set, len(due_keyword_sets), math.ceil(budget / self.page_depth))
+            selected_keyword_sets = []
+            for subset in random.sample(due_keyword_sets, num_sets_to_use):
+                pages = min(self.page_depth, budget)
+                selected_keyword_sets.append((subset, pages))
+                budget -= pages
+            self.logger.info(f"🎲 Selecionados {num_sets_to_use} de {len(due_keyword_sets)} subconjuntos vencidos para esta verificação.")
+        
+        self.scheduler.mark_selected([keywords for keywords, _ in selected_keyword_sets])
+        self._spend_page_budget(sum(pages for _, pages in selected_keyword_sets))
+        return selected_keyword_sets
+
+    def _page_budget(self):
+        """Páginas por intervalo base: number_set * page_depth com subconjuntos, page_depth sem"""
+        return self.page_depth * (self.number_set if self.allow_subset else 1)
+
+    def _remaining_page_budget(self, now=None):
+        """(páginas disponíveis, horário em que volta a sobrar orçamento) na janela móvel de um
+           intervalo base: nenhum intervalo base gasta mais que _page_budget() páginas"""
+        now = now or time.time()
+        window = self.monitoring_interval * 60
+        with self._budget_lock:
+            while self.budget_spends and self.budget_spends[0][0] <= now - window:
+                self.budget_spends.popleft()
+            remaining = self._page_budget() - sum(pages for _, pages in self.budget_spends)
+            if remaining > 0:
+                return remaining, None
+            # Libera quando saírem da janela gastos suficientes para ao menos uma página
+            freed = 0
+            for spent_at, pages in self.budget_spends:
+                freed += pages
+                if remaining + freed > 0:
+                    return 0, spent_at + window
+            return 0, now + window
+
+    def _spend_page_budget(self, pages, now=None):
+        if pages:
+            with self._budget_lock:
+                self.budget_spends.append((now or time.time(), pages))
+
+    def _allocate_keyword_sets(self, all_keyword_subsets, budget):
+        """Divide as páginas que restam no orçamento do intervalo pelo rendimento de cada subconjunto;
+           o alocador decide quais vencidos ficam de fora"""
+        yield_counters = {subset: self.stats.get_yield_counters(subset) for subset in all_keyword_subsets}
+        selected_keyword_sets = self.allocator.allocate(all_keyword_subsets, yield_counters, budget, self.page_depth)
+
+        explored = sum(1 for entry in self.allocator.last_plan if entry['mode'] == 'explore')
+        pages = sum(pages for _, pages in selected_keyword_sets)
+        self.logger.info(f"🎰 Alocados {pages}/{budget} páginas em {len(selected_keyword_sets)} subconjuntos ({explored} em exploração).")
+        for entry in self.allocator.last_plan:
+            mode = " (exploração)" if entry['mode'] == 'explore' else ""
+            self.logger.info(f"   🎯 {', '.join(entry['keywords'])}: {entry['pages']} página(s), taxa sorteada {entry['rate']}{mode}")
         return selected_keyword_sets
 
     def _scrape_page(self, page_num, current_keywords, set_idx, total_sets):
@@ -181,6 +360,7 @@ class Monitor:
         self.logger.info(f"📚 Tentando raspar página {page_num}/{self.page_depth} para o conjunto de palavras chave atual..., conjunto: {set_idx + 1}/{total_sets}.")
         
         page_attempt = 0
+        retry_wait = 0.0
         while page_attempt < self.retry_attempts:
             if self.stop_event.is_set():
                 self.is_running = False
@@ -188,27 +368,34 @@ class Monitor:
                 return None
             
             page_attempt += 1
+            attempt_started = time.perf_counter()
+            cpu_started = time.thread_time()
             try:
                 self.logger.info(f"🪜 Inicio processo monitor de scrape da página {page_num} (Tentativa {page_attempt}/{self.retry_attempts})")
 
-                new_ads_from_page = self.scraper.scrape_err(
-                    query_keywords=current_keywords,
-                    keywords=self.keywords,
-                    negative_keywords_list=self.negative_keywords_list,
-                    positive_keywords_list=self.positive_keywords_list,
-                    start_page=page_num,
-                    save_page=False,
-                    num_pages_to_scrape=1,
-                    page_retry_attempts=1,
-                    page_retry_delay_min=self.min_repeat_time,
-                    page_retry_delay_max=self.max_repeat_time
-                )
+                with span("page", page=page_num, attempt=page_attempt) as page_span:
+                    new_ads_from_page = self.scraper.scrape_err(
+                        query_keywords=current_keywords,
+                        keywords=self.keywords,
+                        negative_keywords_list=self.negative_keywords_list,
+                        positive_keywords_list=self.positive_keywords_list,
+                        start_page=page_num,
+                        save_page=False,
+                        num_pages_to_scrape=1,
+                        page_retry_attempts=1,
+                        page_retry_delay_min=self.min_repeat_time,
+                        page_retry_delay_max=self.max_repeat_time
+                    )
+                    page_span.set_tag("ads", len(new_ads_from_page))
 
                 # Registra sucesso
+                scrape_metrics = getattr(self.scraper, 'last_metrics', {})
                 self.stats.record_success(
                     keywords=current_keywords,
                     page_num=page_num,
-                    ads_found=len(new_ads_from_page)
+                    ads_found=len(new_ads_from_page),
+                    parse_duration=scrape_metrics.get('parse_duration'),
+                    **self._attempt_cost(scrape_metrics, attempt_started, cpu_started, retry_wait)
                 )
 
                 self.logger.info(f"🏆 Página {page_num} raspada com sucesso para o conjunto {set_idx + 1}. Encontrados {len(new_ads_from_page)} anúncios.")
@@ -219,18 +406,22 @@ class Monitor:
                 error_message = str(e)
                 
                 # Registra erro
+                scrape_metrics = getattr(self.scraper, 'last_metrics', {})
                 self.stats.record_error(
                     keywords=current_keywords,
                     page_num=page_num,
                     error_type=error_type,
-                    error_message=error_message
+                    error_message=error_message,
+                    **self._attempt_cost(scrape_metrics, attempt_started, cpu_started, retry_wait)
                 )
                 
                 self.logger.error(f"❌ Erro na raspagem da página {page_num} (Conjunto {set_idx + 1}, Tentativa {page_attempt}/{self.retry_attempts}): {error_type} - {error_message}")
                 
                 if page_attempt < self.retry_attempts:
-                    retry_delay = random.uniform(5, 15)
-                    if self.stop_event.wait(timeout=retry_delay):
+                    retry_wait = random.uniform(5, 15)
+                    with span("sleep", reason="monitor_retry", seconds=round(retry_wait, 1)):
+                        interrupted = self.stop_event.wait(timeout=retry_wait)
+                    if interrupted:
                         self.is_running = False
                         self.logger.info("🛑 Monitoramento interrompido durante espera de retry por stop_event.")
                         return None
@@ -240,29 +431,49 @@ class Monitor:
                     
             return None
 
-    def _scrape_keyword_set(self, current_keywords_tuple, set_idx, total_sets):
-        """Raspa todas as páginas para um conjunto específico de palavras-chave"""
+    @staticmethod
+    def _attempt_cost(scrape_metrics, attempt_started, cpu_started, retry_wait):
+        """Custo de uma tentativa de página; a espera de retry anterior entra nesta tentativa"""
+        return {
+            'fetch_duration': scrape_metrics.get('fetch_duration'),
+            'response_bytes': scrape_metrics.get('response_bytes'),
+            'requests': scrape_metrics.get('requests'),
+            'wall_duration': time.perf_counter() - attempt_started + retry_wait,
+            'cpu_duration': time.thread_time() - cpu_started,
+            'sleep_duration': scrape_metrics.get('sleep_duration', 0) + retry_wait,
+            'ads_parsed': scrape_metrics.get('ads_parsed')
+        }
+
+    def _scrape_keyword_set(self, current_keywords_tuple, set_idx, total_sets, pages=None):
+        """Raspa as páginas (page_depth, ou as alocadas no ciclo) de um conjunto de palavras-chave.
+           Retorna (anúncios, páginas raspadas com sucesso)."""
         current_keywords = list(current_keywords_tuple)
+        pages = pages or self.page_depth
         self.logger.info(f"🦭 Processando conjunto de palavras-chave {set_idx + 1}/{total_sets}: {', '.join(current_keywords)}")
         
         ads_from_set = []
+        pages_scraped = 0
         
-        for page_num in range(1, self.page_depth + 1):
-            new_ads_from_page = self._scrape_page(page_num, current_keywords, set_idx, total_sets)
-            
-            if new_ads_from_page is None:
-                self.logger.info(f"⏭️ Pulando para o próximo conjunto devido a falha persistente na página {page_num}.")
-                break
-            
-            ads_from_set.extend(new_ads_from_page)
-            
-            if not self.is_running:
-                break
+        with span("keyword_set", keywords=", ".join(current_keywords), set=set_idx + 1, pages=pages) as set_span:
+            for page_num in range(1, pages + 1):
+                new_ads_from_page = self._scrape_page(page_num, current_keywords, set_idx, total_sets)
+                
+                if new_ads_from_page is None:
+                    self.logger.info(f"⏭️ Pulando para o próximo conjunto devido a falha persistente na página {page_num}.")
+                    break
+                
+                ads_from_set.extend(new_ads_from_page)
+                pages_scraped += 1
+                
+                if not self.is_running:
+                    break
+            set_span.set_tag("ads", len(ads_from_set))
         
-        return ads_from_set
+        return ads_from_set, pages_scraped
 
     def _process_new_ads(self, all_ads):
         """Processa anúncios encontrados, filtra duplicatas e retorna anúncios realmente novos"""
+        ADS_FOUND.inc(len(all_ads))
         hash_ad_tuples = [(self._hash_ad(ad), ad) for ad in all_ads]
         truly_new_ads = []
         truly_new_ads_hash_list = []
@@ -279,9 +490,11 @@ class Monitor:
                 continue
             
             seen_in_this_cycle.add(ad_hash)
+            ad.setdefault('first_seen', time.time())
             truly_new_ads_hash_list.append(ad_hash)
             truly_new_ads.append(ad)
         
+        ADS_NEW.inc(len(truly_new_ads))
         self.logger.info(f"🔍 {duplicated_count} já vistos, {duplicates_in_cycle} duplicados no ciclo, {len(truly_new_ads)} novos")
         
         if not truly_new_ads:
@@ -289,7 +502,7 @@ class Monitor:
             
         return truly_new_ads, truly_new_ads_hash_list
 
-    def _send_new_ads_to_telegram(self, truly_new_ads, truly_new_ads_hash):
+    def _send_new_ads_to_telegram(self, truly_new_ads, truly_new_ads_hash, keywords=None):
         """Envia anúncios novos para o Telegram e salva os hashes"""
         if not truly_new_ads:
             self.logger.info("ℹ️ Nenhum anúncio novo encontrado neste ciclo.")
@@ -333,63 +546,94 @@ class Monitor:
             return
         
         try:
-            # Send ads one by one or in batches based on batch_size
-            messages = self._split_message(ads_to_send)
+            # Agrupa anúncios inteiros por mensagem, mantendo os hashes de cada uma
+            messages = self._split_message(ads_to_send, hashes_to_send)
             successfully_sent_hashes = []
             
-            for msg_idx, msg in enumerate(messages):
+            for msg_idx, (msg, msg_hashes) in enumerate(messages):
                 if not self.is_running:
                     self.logger.info("🛑 Monitoramento interrompido antes de enviar todas as mensagens.")
                     break
                 
                 try:
-                    self.telegram_bot.send_message(self.chat_id, msg)
-                    
-                    # Calculate which ads were sent in this message
-                    # Each message contains batch_size ads (or remaining ads if less than batch_size)
-                    start_idx = msg_idx * self.batch_size
-                    end_idx = min(start_idx + self.batch_size, len(hashes_to_send))
+                    with span("telegram_send", message=msg_idx + 1, ads=len(msg_hashes)):
+                        self._deliver_message(msg)
                     
-                    # Add the hashes of successfully sent ads
-                    successfully_sent_hashes.extend(hashes_to_send[start_idx:end_idx])
+                    # Add the hashes of the ads packed into this message
+                    successfully_sent_hashes.extend(msg_hashes)
+                    ADS_SENT.inc(len(msg_hashes))
                     
-                    self.logger.info(f"📤 Mensagem {msg_idx + 1}/{len(messages)} enviada com sucesso ({end_idx - start_idx} anúncios)")
+                    self.logger.info(f"📤 Mensagem {msg_idx + 1}/{len(messages)} enviada com sucesso ({len(msg_hashes)} anúncios)")
                     
                 except Exception as send_error:
                     self.logger.error(f"❌ Erro ao enviar mensagem {msg_idx + 1}/{len(messages)}: {str(send_error)}")
                     continue
                 
-                if self.stop_event.wait(timeout=1):
+                with span("sleep", reason="telegram_pacing", seconds=1):
+                    interrupted = self.stop_event.wait(timeout=1)
+                if interrupted:
                     self.is_running = False
                     self.logger.info("🛑 Monitoramento interrompido durante o envio de mensagens.")
                     break
             
+            if successfully_sent_hashes:
+                self.stats.record_delivery(keywords or self.keywords, len(successfully_sent_hashes))
+
             # Save hashes of successfully sent ads
             if self.is_running and successfully_sent_hashes:
-                for ad_hash in successfully_sent_hashes:
-                    if ad_hash not in self.seen_ads:
-                        self.seen_ads.add(ad_hash)
-                        self._save_ad_hash(ad_hash)
+                with span("save_hashes", count=len(successfully_sent_hashes)):
+                    for ad_hash in successfully_sent_hashes:
+                        if ad_hash not in self.seen_ads:
+                            self.seen_ads.add(ad_hash)
+                            self._save_ad_hash(ad_hash)
                 
                 self.logger.info(f"📩 Enviados {len(successfully_sent_hashes)} novos anúncios para Telegram e salvos {len(successfully_sent_hashes)} hashes")
+                self._archive_sent_ads(truly_new_ads, truly_new_ads_hash, successfully_sent_hashes, keywords)
                     
         except Exception as e:
             self.logger.error(f"❌ Erro geral ao enviar mensagens para Telegram: {str(e)}")
 
+    def _archive_sent_ads(self, ads, hashes, sent_hashes, keywords):
+        """Grava os anúncios entregues no arquivo consultável; falhas não afetam o envio"""
+        sent = set(sent_hashes)
+        try:
+            with span("archive", count=len(sent)):
+                stored = self.ad_store.add_ads(
+                    [(ad_hash, ad) for ad_hash, ad in zip(hashes, ads) if ad_hash in sent],
+                    keywords or self.keywords
+                )
+            self.logger.info(f"🗄️ {stored} anúncios gravados no arquivo de anúncios")
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao gravar anúncios no arquivo: {str(e)}")
+
     def _wait_for_next_cycle(self):
-        """Aguarda o intervalo antes do próximo ciclo de monitoramento"""
-        wait_time_minutes = self.monitoring_interval
-        self.logger.info(f"⏳ Aguardando próximo ciclo ({wait_time_minutes} minutos)...")
-        seconds_to_wait = wait_time_minutes * 60
+        """Dorme até o próximo conjunto de palavras-chave vencer no agendador"""
+        logged_due = None
 
-        for i in range(0, seconds_to_wait, 10):
+        # Parada e nova configuração (apply_config) acordam a espera, que recalcula o prazo
+        while True:
             if self.stop_event.is_set():
                 self.is_running = False
                 self.logger.info("🛑 Monitoramento interrompido durante espera do ciclo por stop_event.")
                 return False
-            self.stop_event.wait(timeout=10)
-        
-        return True
+            self.wake_event.clear()
+            next_due = self.scheduler.next_due(self._keyword_set_candidates())
+            budget, refill_at = self._remaining_page_budget()
+            # Orçamento do intervalo esgotado: os vencidos esperam sobrar página, sem ciclos seguidos
+            budget_wait = budget <= 0 and next_due is not None and refill_at > next_due
+            if budget_wait:
+                next_due = refill_at
+            remaining = next_due - time.time() if next_due is not None else 0
+            if remaining <= 0:
+                return True
+            if next_due != logged_due:
+                due_time = datetime.fromtimestamp(next_due, timezone(timedelta(hours=-3))).strftime("%H:%M:%S")
+                if budget_wait:
+                    self.logger.info(f"⏳ Orçamento de {self._page_budget()} páginas do intervalo esgotado; próximo ciclo às {due_time} (GMT-3), em {remaining / 60:.1f} minutos...")
+                else:
+                    self.logger.info(f"⏳ Aguardando próximo conjunto vencer às {due_time} (GMT-3), em {remaining / 60:.1f} minutos...")
+                logged_due = next_due
+            self.wake_event.wait(timeout=remaining)
 
     def _run_monitoring_cycle(self, cycle_count):
         """Executa um ciclo completo de monitoramento"""
@@ -406,27 +650,43 @@ class Monitor:
             current_time = current_time_gmt3.strftime("%H:%M:%S")
             self.logger.info(f"👓 Verificação #{cycle_count} - {current_time} (GMT-3)")
             
-            selected_keyword_sets = self._select_keyword_sets()
-            
-            # Processa cada conjunto individualmente para envio imediato
-            for set_idx, current_keywords_tuple in enumerate(selected_keyword_sets):
-                ads_from_set = self._scrape_keyword_set(current_keywords_tuple, set_idx, len(selected_keyword_sets))
-                
-                if not ads_from_set:
-                    continue
-                
-                truly_new_ads, truly_new_ads_hash = self._process_new_ads(ads_from_set)
+            with span("cycle", cycle=cycle_count) as cycle_span:
+                selected_keyword_sets = self._select_keyword_sets()
+                cycle_span.set_tag("sets", len(selected_keyword_sets))
                 
-                if truly_new_ads:
-                    self._send_new_ads_to_telegram(truly_new_ads, truly_new_ads_hash)
-                
-                if not self.is_running:
-                    break
+                # Processa cada conjunto individualmente para envio imediato
+                for set_idx, (current_keywords_tuple, pages) in enumerate(selected_keyword_sets):
+                    set_started = time.time()
+                    ads_from_set, pages_scraped = self._scrape_keyword_set(current_keywords_tuple, set_idx, len(selected_keyword_sets), pages)
+                    
+                    new_ads_count = 0
+                    if ads_from_set:
+                        with span("dedupe", found=len(ads_from_set)) as dedupe_span:
+                            truly_new_ads, truly_new_ads_hash = self._process_new_ads(ads_from_set)
+                            dedupe_span.set_tag("new", len(truly_new_ads))
+                        new_ads_count = len(truly_new_ads)
+                        
+                        if truly_new_ads:
+                            with span("send", ads=len(truly_new_ads)):
+                                self._send_new_ads_to_telegram(truly_new_ads, truly_new_ads_hash, current_keywords_tuple)
+                    
+                    if not self.is_running:
+                        break
+                    
+                    if not pages_scraped:
+                        # Falha não é "nenhum anúncio novo": não mexe na taxa estimada do conjunto
+                        interval = self.scheduler.record_failure(current_keywords_tuple)
+                        self.logger.info(f"🗓️ Nenhuma página de '{', '.join(current_keywords_tuple)}' raspada; nova tentativa em {interval / 60:.1f} minutos")
+                        continue
+                    interval = self.scheduler.record_poll(current_keywords_tuple, set_started, new_ads_count)
+                    self.logger.info(f"🗓️ Próxima consulta de '{', '.join(current_keywords_tuple)}' em {interval / 60:.1f} minutos ({new_ads_count} novos agora)")
         except Exception as e:
             self.logger.error(f"❌ Erro geral durante verificação de ciclo: {str(e)}")
         
         cycle_end_time = time.time()
         cycle_duration = cycle_end_time - cycle_start_time
+        CYCLE_DURATION.observe(cycle_duration)
+        self.last_cycle_duration = round(cycle_duration, 1)
         self.logger.info(f"⏱️ Ciclo de verificação concluído em {cycle_duration:.1f} segundos.")
         
         return True
@@ -435,20 +695,26 @@ class Monitor:
         """Função principal do monitoramento (síncrona)"""
         self.is_running = True
         self.stop_event.clear()
+        MONITOR_RUNNING.set(1)
+        start_publisher()
+        self.state_publisher.start()
         self.logger.info("🦉 Monitoramento iniciado!")
 
-        cycle_count = 0
+        self.cycle_count = 0
 
         while self.is_running:
-            cycle_count += 1
+            self.cycle_count += 1
             
-            if not self._run_monitoring_cycle(cycle_count):
+            if not self._run_monitoring_cycle(self.cycle_count):
                 break
             
             if not self._wait_for_next_cycle():
                 break
 
         self.is_running = False
+        MONITOR_RUNNING.set(0)
+        self.stats.close()
+        self.state_publisher.stop()
         self.logger.info("Monitoramento finalizado.")
 
     def start_async(self):
@@ -456,7 +722,7 @@ class Monitor:
         if self.is_running:
             self.logger.warning("Tentativa de iniciar monitoramento já ativo")
             return False
-        self.thread = threading.Thread(target=self.start, daemon=True)
+        self.thread = threading.Thread(target=self.start, name="monitor", daemon=True)
         self.thread.start()
         self.logger.info("Monitoramento iniciado em thread separada")
         return True
@@ -469,6 +735,7 @@ class Monitor:
         
         self.logger.info("🛑 Comando de parada enviado...")
         self.stop_event.set()
+        self.wake_event.set()
         
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=10)
@@ -481,15 +748,49 @@ class Monitor:
         self.logger.info("Monitoramento parado com sucesso")
         return True
 
-    def _split_message(self, ads):
+    def _split_message(self, ads, hashes):
+        """Agrupa anúncios inteiros em mensagens que respeitam o limite do Telegram.
+
+        Cada mensagem é preenchida até o limite de caracteres (unidades UTF-16), para
+        gastar o mínimo de chamadas à API. batch_size ("Máximo de anúncios por mensagem"
+        no painel) só limita a quantidade se for maior que zero.
+        Retorna lista de (mensagem, hashes dos anúncios contidos nela).
+        """
+        separator = "\n\n"
+        max_length = self.telegram_bot.MAX_MESSAGE_LENGTH
+        measure = self.telegram_bot.message_length
+        max_ads = int(self.batch_size or 0) or None
+
+        # Reserva espaço para o maior cabeçalho possível (emoji ocupa até 2 unidades)
+        header_budget = measure(self._message_header("XX", len(ads), len(ads), len(ads)))
+        content_budget = max_length - header_budget
+
+        groups = []
+        current_ads, current_hashes, current_length = [], [], 0
+        for ad, ad_hash in zip(ads, hashes):
+            ad_length = measure(ad)
+            new_length = current_length + ad_length + (measure(separator) if current_ads else 0)
+            full = max_ads is not None and len(current_ads) >= max_ads
+            if current_ads and (new_length > content_budget or full):
+                groups.append((current_ads, current_hashes))
+                current_ads, current_hashes, current_length = [], [], 0
+                new_length = ad_length
+            # Um anúncio maior que o limite vai sozinho; send_message o quebra por linhas
+            current_ads.append(ad)
+            current_hashes.append(ad_hash)
+            current_length = new_length
+        if current_ads:
+            groups.append((current_ads, current_hashes))
+
+        single_ad_messages = all(len(group_ads) == 1 for group_ads, _ in groups)
         messages = []
-        for i in range(0, len(ads), self.batch_size):
-            batch = ads[i:i + self.batch_size]
-            selected_emoji = get_random_emoji()
-            if self.batch_size == 1:
-                message_header = f"{selected_emoji} Novo anúncio encontrado:\n\n"
-            else:
-                message_header = f"{selected_emoji} Novos anúncios encontrados (parte {len(messages) + 1} de {(len(ads) + self.batch_size - 1) // self.batch_size}):\n\n"
-            message_content = "\n\n".join(batch)
-            messages.append(message_header + message_content)
-        return messages
\ No newline at end of file
+        for part, (group_ads, group_hashes) in enumerate(groups, start=1):
+            ads_in_message = 1 if single_ad_messages else len(group_ads)
+            header = self._message_header(get_random_emoji(), ads_in_message, part, len(groups))
+            messages.append((header + separator.join(group_ads), group_hashes))
+        return messages
+
+    def _message_header(self, emoji, ads_in_message, part, total_parts):
+        if ads_in_message == 1:
+            return f"{emoji} Novo anúncio encontrado:\n\n"
+        return f"{emoji} Novos anúncios encontrados (parte {part} de {total_parts}):\n\n"
@@ -0,0 +1,290 @@
+"""
+Processo dedicado do monitor, separado dos workers web.
+
+O servidor Flask controla o daemon por um socket Unix local (uma requisição
+JSON por conexão). Assim os workers do gunicorn podem ser reciclados à vontade
+sem derrubar o loop de scraping.
+
+Uso:
+    python monitor_daemon.py [--autostart]
+    MONITOR_DAEMON=1 gunicorn -c gunicorn.conf.py server:app
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+from dotenv import load_dotenv
+from config_store import ConfigStore
+from logging_config import get_logger
+from profiler import DEFAULT_PROFILE_RATE, ProfilerBusyError, profile_process
+from shared_state import get_shared_state_dir
+
+CONFIG_FILE_PATH = 'config.json'
+
+
+def get_socket_path():
+    return os.getenv("MONITOR_SOCKET", os.path.join(get_shared_state_dir(), "monitor.sock"))
+
+
+def monitor_settings(config):
+    """Converte a configuração salva no painel nos parâmetros do Monitor"""
+    keywords_list = [kw.strip() for kw in config["keywords"].split(",") if kw.strip()]
+    negative_keywords_list = [kw.strip() for kw in config["negative_keywords_list"].split(",") if kw.strip()]
+    positive_keywords_list = [kw.strip() for kw in config["positive_keywords_list"].split(",") if kw.strip()]
+
+    return dict(
+        keywords=keywords_list,
+        negative_keywords_list=negative_keywords_list,
+        positive_keywords_list=positive_keywords_list,
+        chat_id=config["chat_input"],
+        batch_size=config.get("batch_size", 0),
+        number_set=config["number_set"],
+        monitoring_interval=config["interval_monitor"],
+        min_monitoring_interval=config.get("interval_min"),
+        max_monitoring_interval=config.get("interval_max"),
+        page_depth=config["page_depth"],
+        retry_attempts=config["retry_attempts"],
+        min_repeat_time=config["min_repeat_time"],
+        max_repeat_time=config["max_repeat_time"],
+        allow_subset=config["allow_subset"],
+        adaptive_subsets=config.get("adaptive_subsets", True),
+        send_as_batch=config["send_as_batch"],
+        min_subset_size=config["min_subset_size"] if len(keywords_list) >= 3 else len(keywords_list),
+        max_subset_size=config["max_subset_size"] if config["max_subset_size"] <= len(keywords_list) else len(keywords_list)
+    )
+
+
+def build_monitor(config, base_url, proxies):
+    """Cria Monitor, scraper e bot a partir da configuração salva no painel"""
+    # Imports tardios: o cliente (workers web) não precisa carregar o scraper
+    from monitor import Monitor
+    from scraper_cloudflare import MarketRoxoScraperCloudflare
+    from telegram_bot import TelegramBot
+
+    telegram_bot = TelegramBot(token=config["token"])
+    scraper = MarketRoxoScraperCloudflare(
+        base_url=base_url,
+        proxies=proxies
+    )
+
+    return Monitor(scraper=scraper, telegram_bot=telegram_bot, **monitor_settings(config))
+
+
+def apply_monitor_config(monitor, config):
+    """Aplica a configuração num Monitor em execução, mantendo scraper e sessão.
+       Só recria o bot do Telegram se o token mudou. Retorna os campos alterados."""
+    settings = monitor_settings(config)
+    if config["token"] != monitor.telegram_bot.token:
+        from telegram_bot import TelegramBot
+        settings['telegram_bot'] = TelegramBot(token=config["token"])
+    return monitor.apply_config(**settings)
+
+
+class MonitorDaemon:
+    """Mantém o monitor vivo e atende comandos do servidor pelo socket Unix"""
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or get_socket_path()
+        self.base_url = os.getenv("MAIN_URL_SCRAPE_ROXO", "")
+        self.proxies = {
+            "http": os.getenv("HTTP_PROXY", ""),
+            "https": os.getenv("HTTPS_PROXY", "")
+        }
+        self.monitor = None
+        self.config_store = ConfigStore(CONFIG_FILE_PATH)
+        self.server_socket = None
+        self.shutdown_event = threading.Event()
+        self.commands = {
+            'start': self.cmd_start,
+            'stop': self.cmd_stop,
+            'status': self.cmd_status,
+            'export_stats': self.cmd_export_stats,
+            'reset_stats': self.cmd_reset_stats,
+            'reload': self.cmd_reload,
+            'profile': self.cmd_profile,
+        }
+        # Comandos demorados respondem numa thread própria para não travar os demais
+        self.background_commands = {'profile'}
+
+    @property
+    def logger(self):
+        """Property que sempre retorna o logger atualizado"""
+        return get_logger()
+
+    def _is_monitor_running(self):
+        return bool(self.monitor and self.monitor.is_running and self.monitor.thread and self.monitor.thread.is_alive())
+
+    # --- Comandos ---
+    def cmd_start(self, config=None):
+        if self._is_monitor_running():
+            return {'ok': False, 'message': "Monitoramento já está ativo!"}
+        if not self.base_url:
+            return {'ok': False, 'message': "MAIN_URL_SCRAPE_ROXO não definida"}
+        if config is None:
+            config = self.config_store.load()
+        self.monitor = build_monitor(config, self.base_url, self.proxies)
+        if not self.monitor.start_async():
+            return {'ok': False, 'message': "Erro ao iniciar monitoramento: já está ativo"}
+        self.logger.info(f"🛰️ Daemon iniciou monitoramento com {len(self.monitor.keywords)} palavras-chave")
+        return {'ok': True, 'message': "Monitoramento iniciado com sucesso!"}
+
+    def cmd_stop(self):
+        if self.monitor is None:
+            return {'ok': True, 'message': "Monitoramento já está parado"}
+        stopped = self.monitor.stop()
+        if stopped:
+            self.monitor = None
+            return {'ok': True, 'message': "Monitoramento encerrado com sucesso!"}
+        return {'ok': False, 'message': "Monitoramento parcialmente encerrado com falhas"}
+
+    def cmd_reload(self, config=None):
+        if config is None:
+            config = self.config_store.load()
+        if not self._is_monitor_running():
+            return {'ok': True, 'applied': False, 'message': "Configuração salva; será usada no próximo início"}
+        changed = apply_monitor_config(self.monitor, config)
+        return {'ok': True, 'applied': True, 'changed': changed,
+                'message': f"Configuração aplicada sem reiniciar ({len(changed)} campos alterados)"}
+
+    def cmd_status(self):
+        running = self._is_monitor_running()
+        return {
+            'ok': True,
+            'status': "running" if running else "stopped",
+            'message': f"Monitoramento ativo (PID: {os.getpid()})" if running else "Nenhum monitoramento ativo",
+            'pid': os.getpid()
+        }
+
+    def cmd_export_stats(self):
+        if self.monitor is None:
+            return {'ok': False, 'message': 'Monitor não inicializado'}
+        export_file = self.monitor.stats.export_stats()
+        if not export_file:
+            return {'ok': False, 'message': 'Falha ao exportar estatísticas'}
+        return {'ok': True, 'message': 'Estatísticas exportadas com sucesso', 'file': export_file}
+
+    def cmd_reset_stats(self):
+        if self.monitor is None:
+            return {'ok': False, 'message': 'Monitor não inicializado'}
+        self.monitor.stats.reset_stats()
+        return {'ok': True, 'message': 'Estatísticas resetadas com sucesso'}
+
+    def cmd_profile(self, seconds=10, rate=DEFAULT_PROFILE_RATE, thread=None):
+        try:
+            result = profile_process(seconds, rate, thread)
+        except ProfilerBusyError as e:
+            return {'ok': False, 'busy': True, 'message': str(e)}
+        return dict(result, ok=True, message=f"{result['samples']} amostras coletadas")
+
+    # --- Socket ---
+    def _handle_connection(self, conn):
+        try:
+            conn.settimeout(10)
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            request = json.loads(data)
+            command = request.get('command')
+            handler = self.commands.get(command)
+            if handler is None:
+                return self._respond(conn, lambda: {'ok': False, 'message': f"Comando desconhecido: {command}"})
+            args = request.get('args', {})
+            if command in self.background_commands:
+                threading.Thread(target=self._respond, args=(conn, lambda: handler(**args)),
+                                 name=f"daemon-{command}", daemon=True).start()
+                return
+            self._respond(conn, lambda: handler(**args))
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao processar comando do daemon: {str(e)}")
+            self._respond(conn, lambda: {'ok': False, 'message': str(e)})
+
+    def _respond(self, conn, produce):
+        """Executa o comando, envia a resposta JSON e fecha a conexão"""
+        with conn:
+            try:
+                response = produce()
+            except Exception as e:
+                self.logger.error(f"❌ Erro ao processar comando do daemon: {str(e)}")
+                response = {'ok': False, 'message': str(e)}
+            try:
+                conn.sendall(json.dumps(response).encode('utf-8') + b"\n")
+            except OSError as e:
+                self.logger.error(f"❌ Erro ao responder comando do daemon: {str(e)}")
+
+    def serve_forever(self, autostart=False):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.server_socket.listen(16)
+        self.server_socket.settimeout(1)
+        self.logger.info(f"🛰️ Daemon do monitor escutando em {self.socket_path} (PID: {os.getpid()})")
+
+        if autostart and self.config_store.load():
+            self.logger.info(f"🛰️ Autostart: {self.cmd_start()['message']}")
+
+        try:
+            while not self.shutdown_event.is_set():
+                try:
+                    conn, _ = self.server_socket.accept()
+                except socket.timeout:
+                    continue
+                self._handle_connection(conn)
+        finally:
+            self.cmd_stop()
+            self.server_socket.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.logger.info("🛰️ Daemon do monitor finalizado")
+
+    def request_shutdown(self, signum=None, frame=None):
+        self.shutdown_event.set()
+
+
+class MonitorClient:
+    """Cliente usado pelos workers web para controlar o daemon"""
+
+    def __init__(self, socket_path=None, timeout=20):
+        self.socket_path = socket_path or get_socket_path()
+        self.timeout = timeout
+
+    def send(self, command, **args):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({'command': command, 'args': args}).encode('utf-8') + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            # Daemon fechou a conexão sem responder (ou no meio da resposta)
+            raise ConnectionError(f"resposta inválida do daemon: {str(e)}") from e
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Daemon do monitor Market Roxo")
+    parser.add_argument("--autostart", action="store_true",
+                        help="inicia o monitoramento com o config.json salvo ao subir o daemon")
+    parser.add_argument("--socket", default=None, help="caminho do socket Unix de controle")
+    args = parser.parse_args()
+
+    daemon = MonitorDaemon(socket_path=args.socket)
+    signal.signal(signal.SIGTERM, daemon.request_shutdown)
+    signal.signal(signal.SIGINT, daemon.request_shutdown)
+    daemon.serve_forever(autostart=args.autostart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Amostragem sob demanda das pilhas das threads (sys._current_frames), sem profiler externo.
+# Nada roda fora de uma chamada a sample_stacks: custo zero quando ocioso.
+MAX_PROFILE_SECONDS = 25  # abaixo do timeout do gunicorn (30s)
+MAX_PROFILE_RATE = 250
+DEFAULT_PROFILE_RATE = 100
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Já existe uma amostragem em andamento neste processo"""
+    pass
+
+
+def _frame_label(code):
+    # Mesmo formato do py-spy: função (arquivo:linha da definição)
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds, rate=DEFAULT_PROFILE_RATE, thread_filter=None):
+    """Amostra as pilhas de todas as threads (menos a própria) por `seconds` segundos.
+
+    thread_filter: trecho do nome da thread (ex.: 'monitor'); None amostra todas.
+    Retorna (Counter {pilha colapsada: amostras}, número de amostras).
+    """
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    rate = max(1, min(int(rate), MAX_PROFILE_RATE))
+    interval = 1.0 / rate
+    thread_filter = (thread_filter or "").lower() or None
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Já existe uma amostragem em andamento")
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                name = names.get(thread_id, f"thread-{thread_id}")
+                if thread_filter and thread_filter not in name.lower():
+                    continue
+                stacks[_collapse(frame, name)] += 1
+            del frames, frame  # não segura frames (e seus locals) entre amostras
+            samples += 1
+            next_sample += interval
+            if next_sample > now:
+                time.sleep(next_sample - now)
+            else:
+                next_sample = now  # amostragem atrasou (GIL ocupado): não tenta compensar
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(stacks):
+    """Texto 'frame;frame;frame contagem' por linha (flamegraph.pl, speedscope, inferno)"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def profile_process(seconds, rate=DEFAULT_PROFILE_RATE, thread_filter=None):
+    """Amostra este processo e devolve o resultado pronto para a API / socket do daemon"""
+    stacks, samples = sample_stacks(seconds, rate, thread_filter)
+    thread_names = sorted({stack.split(";", 1)[0] for stack in stacks})
+    return {
+        'pid': os.getpid(),
+        'samples': samples,
+        'threads': thread_names,
+        'collapsed': format_collapsed(stacks)
+    }
@@ -1,15 +1,214 @@
 import os
 import json
+import threading
+import time
+import atexit
+import itertools
 from collections import deque, defaultdict
 from datetime import datetime, timezone
 from logging_config import get_logger
 
+# Limites superiores (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# Janelas móveis: nome -> (segundos por bucket, número de buckets)
+ROLLING_WINDOWS = {
+    '1m': (5, 12),
+    '5m': (15, 20),
+    '1h': (60, 60),
+    '24h': (900, 96)
+}
+
+# Custo e rendimento acumulados por conjunto: campo do contador -> campo do registro
+YIELD_FIELDS = {
+    'requests': 'requests',
+    'response_bytes': 'response_bytes',
+    'wall_time': 'wall_duration',
+    'cpu_time': 'cpu_duration',
+    'sleep_time': 'sleep_duration',
+    'ads_parsed': 'ads_parsed',
+    'ads_matched': 'ads_found',
+    'ads_delivered': 'ads_delivered'
+}
+
+# Conjuntos com pelo menos esse número de requests e nenhum anúncio entregue são marcados sem rendimento
+NO_YIELD_MIN_REQUESTS = 20
+
+
+def yield_summary(counters):
+    """Totais de custo/rendimento + anúncios novos entregues por request, por MB e por minuto"""
+    requests = counters['requests']
+    delivered = counters['ads_delivered']
+    megabytes = counters['response_bytes'] / (1024 * 1024)
+    minutes = counters['wall_time'] / 60
+    return {
+        'requests': requests,
+        'response_bytes': counters['response_bytes'],
+        'wall_time': round(counters['wall_time'], 1),
+        'cpu_time': round(counters['cpu_time'], 2),
+        'sleep_time': round(counters['sleep_time'], 1),
+        'ads_parsed': counters['ads_parsed'],
+        'ads_matched': counters['ads_matched'],
+        'ads_delivered': delivered,
+        'new_per_request': round(delivered / requests, 4) if requests else None,
+        'new_per_mb': round(delivered / megabytes, 3) if megabytes else None,
+        'new_per_minute': round(delivered / minutes, 3) if minutes else None,
+        'match_rate': round(counters['ads_matched'] / counters['ads_parsed'] * 100, 2) if counters['ads_parsed'] else None,
+        'no_yield': requests >= NO_YIELD_MIN_REQUESTS and delivered == 0
+    }
+
+
+class LatencyHistogram:
+    """Histograma de latências com buckets fixos (merge e percentis baratos)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, p):
+        """Estima o percentil interpolando linearmente dentro do bucket"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0
+                return lower + (LATENCY_BUCKETS[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0, 'avg': None, 'p50': None, 'p95': None, 'p99': None}
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 3),
+            'p50': round(self.percentile(50), 3),
+            'p95': round(self.percentile(95), 3),
+            'p99': round(self.percentile(99), 3)
+        }
+
+
+class TimeBucket:
+    """Agregados de um intervalo de tempo de uma janela móvel"""
+
+    def __init__(self, start=0):
+        self.start = start
+        self.success = 0
+        self.error = 0
+        self.error_types = defaultdict(int)
+        self.fetch_latency = LatencyHistogram()
+        self.parse_latency = LatencyHistogram()
+        self.response_bytes = 0
+        self.responses = 0
+
+
+class RollingWindow:
+    """Janela móvel em ring buffer de buckets de tempo"""
+
+    def __init__(self, bucket_seconds, num_buckets):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.buckets = [TimeBucket(-1) for _ in range(num_buckets)]
+        # Próprio lock: o resumo pode ser lido por outra thread enquanto há registros
+        self._lock = threading.Lock()
+
+    def _bucket_for(self, timestamp):
+        start = int(timestamp // self.bucket_seconds) * self.bucket_seconds
+        bucket = self.buckets[(start // self.bucket_seconds) % self.num_buckets]
+        if bucket.start != start:
+            # Bucket pertence a uma volta anterior do ring: recicla
+            bucket.__init__(start)
+        return bucket
+
+    def observe(self, timestamp, record):
+        with self._lock:
+            self._observe(timestamp, record)
+
+    def _observe(self, timestamp, record):
+        bucket = self._bucket_for(timestamp)
+        if record['status'] == 'success':
+            bucket.success += 1
+        else:
+            bucket.error += 1
+            bucket.error_types[record.get('error_type') or 'Unknown'] += 1
+        if record.get('fetch_duration') is not None:
+            bucket.fetch_latency.observe(record['fetch_duration'])
+        if record.get('parse_duration') is not None:
+            bucket.parse_latency.observe(record['parse_duration'])
+        if record.get('response_bytes') is not None:
+            bucket.response_bytes += record['response_bytes']
+            bucket.responses += 1
+
+    def reset(self):
+        with self._lock:
+            self.buckets = [TimeBucket(-1) for _ in range(self.num_buckets)]
+
+    def summary(self, now):
+        with self._lock:
+            return self._summary(now)
+
+    def _summary(self, now):
+        oldest = now - self.bucket_seconds * self.num_buckets
+        success = error = response_bytes = responses = 0
+        error_types = defaultdict(int)
+        fetch_latency = LatencyHistogram()
+        parse_latency = LatencyHistogram()
+        for bucket in self.buckets:
+            if bucket.start <= oldest:
+                continue
+            success += bucket.success
+            error += bucket.error
+            for error_type, count in bucket.error_types.items():
+                error_types[error_type] += count
+            fetch_latency.merge(bucket.fetch_latency)
+            parse_latency.merge(bucket.parse_latency)
+            response_bytes += bucket.response_bytes
+            responses += bucket.responses
+        total = success + error
+        return {
+            'total_requests': total,
+            'success_count': success,
+            'error_count': error,
+            'success_rate': round(success / total * 100, 2) if total else 0,
+            'error_types': dict(error_types),
+            'fetch_latency': fetch_latency.summary(),
+            'parse_latency': parse_latency.summary(),
+            'response_bytes': {
+                'total': response_bytes,
+                'avg': round(response_bytes / responses) if responses else None
+            }
+        }
+
+
 class RequestStats:
     """Classe para gerenciar estatísticas de requests por conjunto de palavras-chave"""
     
-    def __init__(self, stats_file=None, max_history=1000):
+    def __init__(self, stats_file=None, max_history=1000, write_behind=True, flush_interval=30):
         self.max_history = max_history
         self.logger = get_logger()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
         
         # Arquivo para salvar estatísticas
         if stats_file is None:
@@ -19,16 +218,46 @@ class RequestStats:
             self.logger.info(f"📊 Usando arquivo de estatísticas: {self.stats_file}")
         else:
             self.stats_file = stats_file
+
+        # Write-behind: registros vão para memória + journal append-only;
+        # o snapshot completo é gravado periodicamente por uma thread
+        self.journal_file = f"{self.stats_file}.journal"
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._journal_seq = 0
+        self._snapshot_seq = 0
+        self._dirty = False
+        self._flush_stop = threading.Event()
+        self._flush_thread = None
             
         # Contadores por conjunto de palavras-chave
         self.success_counters = defaultdict(int)
         self.error_counters = defaultdict(int)
+
+        # Custo e rendimento acumulados por conjunto (YIELD_FIELDS)
+        self.yield_counters = {}
         
         # Histórico dos últimos N requests (deque para performance)
         self.request_history = deque(maxlen=self.max_history)
+
+        # Agregados incrementais: atualizados a cada append/evicção do histórico,
+        # para que os endpoints de health leiam contadores prontos
+        self._history_success = 0
+        self._history_error = 0
+        self._keyword_stats = {}
+        self._recent_errors = deque()  # erros ainda presentes em request_history, em ordem
+        self.version = 0
+
+        # Janelas móveis por tempo (1 min / 5 min / 1 h / 24 h)
+        self.windows = {name: RollingWindow(*spec) for name, spec in ROLLING_WINDOWS.items()}
         
         # Carrega dados existentes
         self._load_stats()
+        self._rebuild_aggregates()
+
+        if self.write_behind:
+            self._replay_journal()
         
     def _get_keyword_set_key(self, keywords):
         """Converte conjunto de palavras-chave em string chave"""
@@ -46,10 +275,15 @@ class RequestStats:
                 # Carrega contadores
                 self.success_counters = defaultdict(int, data.get('success_counters', {}))
                 self.error_counters = defaultdict(int, data.get('error_counters', {}))
+                self.yield_counters = {
+                    keyword_key: dict(dict.fromkeys(YIELD_FIELDS, 0), **counters)
+                    for keyword_key, counters in data.get('yield_counters', {}).items()
+                }
                 
                 # Carrega histórico (converte de lista para deque)
                 history_data = data.get('request_history', [])
                 self.request_history = deque(history_data, maxlen=self.max_history)
+                self._snapshot_seq = self._journal_seq = data.get('journal_seq', 0)
                 
                 total_success = sum(self.success_counters.values())
                 total_errors = sum(self.error_counters.values())
@@ -57,26 +291,227 @@ class RequestStats:
         except Exception as e:
             self.logger.error(f"❌ Erro ao carregar estatísticas: {str(e)}")
     
+    def _replay_journal(self):
+        """Reaplica registros do journal ainda não incluídos no snapshot"""
+        replayed = 0
+        for journal_file in (f"{self.journal_file}.flushing", self.journal_file):
+            if not os.path.exists(journal_file):
+                continue
+            try:
+                with open(journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # linha truncada por queda do processo
+                        if entry['seq'] <= self._snapshot_seq:
+                            continue
+                        self._apply_entry(entry['op'], entry.get('record'))
+                        self._journal_seq = entry['seq']
+                        replayed += 1
+            except Exception as e:
+                self.logger.error(f"❌ Erro ao reaplicar journal de estatísticas: {str(e)}")
+        if replayed:
+            self._dirty = True
+            self.logger.info(f"📊 {replayed} registros reaplicados do journal de estatísticas")
+            self.flush()
+
+    def _apply_entry(self, op, record=None):
+        """Aplica um registro às estruturas em memória"""
+        self.version += 1
+        if op == 'reset':
+            self.success_counters.clear()
+            self.error_counters.clear()
+            self.yield_counters.clear()
+            self.request_history.clear()
+            self._rebuild_aggregates()
+            return
+        keyword_key = record['keywords']
+        self._add_yield(keyword_key, record)
+        if op == 'delivery':
+            return
+        if op == 'success':
+            self.success_counters[keyword_key] += 1
+        else:
+            self.error_counters[keyword_key] += 1
+            self._recent_errors.append(record)
+
+        # Evicção: o registro mais antigo sai dos agregados do histórico
+        if len(self.request_history) == self.max_history:
+            evicted = self.request_history[0]
+            self._count_history(evicted, -1)
+            if self._recent_errors and self._recent_errors[0] is evicted:
+                self._recent_errors.popleft()
+        self.request_history.append(record)
+        self._count_history(record, 1)
+        self._update_keyword_stats(keyword_key)
+        self._observe_windows(record)
+
+    def _add_yield(self, keyword_key, record):
+        counters = self.yield_counters.get(keyword_key)
+        if counters is None:
+            counters = self.yield_counters[keyword_key] = dict.fromkeys(YIELD_FIELDS, 0)
+        for field, record_field in YIELD_FIELDS.items():
+            value = record.get(record_field)
+            if value:
+                counters[field] += value
+
+    def _observe_windows(self, record):
+        try:
+            timestamp = datetime.fromisoformat(record['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return
+        for window in self.windows.values():
+            window.observe(timestamp, record)
+
+    def _count_history(self, record, delta):
+        if record['status'] == 'success':
+            self._history_success += delta
+        elif record['status'] == 'error':
+            self._history_error += delta
+
+    def _update_keyword_stats(self, keyword_key):
+        success = self.success_counters.get(keyword_key, 0)
+        errors = self.error_counters.get(keyword_key, 0)
+        total = success + errors
+        success_rate = (success / total * 100) if total > 0 else 0
+        self._keyword_stats[keyword_key] = {
+            'keyword_set': keyword_key,
+            'success_count': success,
+            'error_count': errors,
+            'total_requests': total,
+            'success_rate': round(success_rate, 2)
+        }
+
+    def _rebuild_aggregates(self):
+        """Recalcula os agregados a partir do estado completo (só no load/reset)"""
+        self._history_success = 0
+        self._history_error = 0
+        for record in self.request_history:
+            self._count_history(record, 1)
+        self._recent_errors.clear()
+        self._recent_errors.extend(r for r in self.request_history if r['status'] == 'error')
+        self._keyword_stats = {}
+        for keyword_key in set(self.success_counters) | set(self.error_counters):
+            self._update_keyword_stats(keyword_key)
+        for window in self.windows.values():
+            window.reset()
+        for record in self.request_history:
+            self._observe_windows(record)
+
+    def _record(self, op, record=None):
+        """Registra uma operação em memória e persiste (journal ou arquivo completo)"""
+        with self._lock:
+            self._apply_entry(op, record)
+            if not self.write_behind:
+                self._save_stats()
+                return
+            self._journal_seq += 1
+            self._dirty = True
+            try:
+                if self._journal is None:
+                    self._journal = open(self.journal_file, 'a', encoding='utf-8')
+                self._journal.write(json.dumps({'seq': self._journal_seq, 'op': op, 'record': record},
+                                               ensure_ascii=False, separators=(',', ':')) + "\n")
+                self._journal.flush()
+            except Exception as e:
+                self.logger.error(f"❌ Erro ao escrever journal de estatísticas: {str(e)}")
+        if self._flush_thread is None:
+            self._start_flush_thread()
+
+    def _start_flush_thread(self):
+        with self._lock:
+            if self._flush_thread is not None:
+                return
+            self._flush_stop.clear()
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="stats-flush", daemon=True)
+            self._flush_thread.start()
+            # Só enquanto a thread existe: close() desfaz, e instâncias descartadas não se acumulam
+            atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._flush_stop.wait(timeout=self.flush_interval):
+            self.flush()
+
+    def _snapshot_data(self):
+        return {
+            'success_counters': dict(self.success_counters),
+            'error_counters': dict(self.error_counters),
+            'yield_counters': {keyword_key: dict(counters) for keyword_key, counters in self.yield_counters.items()},
+            'request_history': list(self.request_history),
+            'journal_seq': self._journal_seq,
+            'last_updated': datetime.now(timezone.utc).isoformat()
+        }
+
+    def _write_snapshot(self, data, compact):
+        """Grava o snapshot de forma atômica (arquivo temporário + rename)"""
+        tmp_file = f"{self.stats_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            if compact:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            else:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.stats_file)
+
     def _save_stats(self):
         """Salva estatísticas no arquivo"""
         try:
-            data = {
-                'success_counters': dict(self.success_counters),
-                'error_counters': dict(self.error_counters),
-                'request_history': list(self.request_history),
-                'last_updated': datetime.now(timezone.utc).isoformat()
-            }
-            
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-                
+            self._write_snapshot(self._snapshot_data(), compact=False)
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao salvar estatísticas: {str(e)}")
+
+    def flush(self):
+        """Grava um snapshot compacto e descarta o journal já incorporado"""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        flushing_file = f"{self.journal_file}.flushing"
+        with self._lock:
+            if not self._dirty:
+                return
+            data = self._snapshot_data()
+            self._dirty = False
+            # Journal atual passa a "flushing"; novos registros vão para um journal novo
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            try:
+                if os.path.exists(self.journal_file) and not os.path.exists(flushing_file):
+                    os.replace(self.journal_file, flushing_file)
+            except OSError as e:
+                self.logger.error(f"❌ Erro ao rotacionar journal de estatísticas: {str(e)}")
+
+        # Serialização fora do lock: não bloqueia quem está registrando
+        try:
+            self._write_snapshot(data, compact=True)
+            self._snapshot_seq = data['journal_seq']
+            if os.path.exists(flushing_file):
+                os.remove(flushing_file)
         except Exception as e:
+            self._dirty = True
             self.logger.error(f"❌ Erro ao salvar estatísticas: {str(e)}")
+
+    def close(self):
+        """Para a thread de flush e grava o estado pendente (um novo registro reabre tudo)"""
+        atexit.unregister(self.close)
+        if self._flush_thread is not None:
+            self._flush_stop.set()
+            self._flush_thread.join(timeout=5)
+            self._flush_thread = None
+        if self.write_behind:
+            self.flush()
+            with self._lock:
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
     
-    def record_success(self, keywords, page_num=None, ads_found=0):
+    def record_success(self, keywords, page_num=None, ads_found=0,
+                       fetch_duration=None, parse_duration=None, response_bytes=None,
+                       requests=None, wall_duration=None, cpu_duration=None, sleep_duration=None,
+                       ads_parsed=None):
         """Registra um request bem-sucedido"""
         keyword_key = self._get_keyword_set_key(keywords)
-        self.success_counters[keyword_key] += 1
         
         # Adiciona ao histórico
         record = {
@@ -84,17 +519,26 @@ class RequestStats:
             'keywords': keyword_key,
             'status': 'success',
             'page': page_num,
-            'ads_found': ads_found
+            'ads_found': ads_found,
+            'fetch_duration': fetch_duration,
+            'parse_duration': parse_duration,
+            'response_bytes': response_bytes,
+            'requests': requests,
+            'wall_duration': wall_duration,
+            'cpu_duration': cpu_duration,
+            'sleep_duration': sleep_duration,
+            'ads_parsed': ads_parsed
         }
-        self.request_history.append(record)
+        self._record('success', record)
         
         self.logger.info(f"✅ Sucesso registrado para '{keyword_key}' (página {page_num}, {ads_found} anúncios)")
-        self._save_stats()
     
-    def record_error(self, keywords, page_num=None, error_type=None, error_message=None):
+    def record_error(self, keywords, page_num=None, error_type=None, error_message=None,
+                     fetch_duration=None, response_bytes=None,
+                     requests=None, wall_duration=None, cpu_duration=None, sleep_duration=None,
+                     ads_parsed=None):
         """Registra um request com erro"""
         keyword_key = self._get_keyword_set_key(keywords)
-        self.error_counters[keyword_key] += 1
         
         # Adiciona ao histórico
         record = {
@@ -103,52 +547,50 @@ class RequestStats:
             'status': 'error',
             'page': page_num,
             'error_type': error_type,
-            'error_message': error_message[:200] if error_message else None  # Limita tamanho da mensagem
+            'error_message': error_message[:200] if error_message else None,  # Limita tamanho da mensagem
+            'fetch_duration': fetch_duration,
+            'response_bytes': response_bytes,
+            'requests': requests,
+            'wall_duration': wall_duration,
+            'cpu_duration': cpu_duration,
+            'sleep_duration': sleep_duration,
+            'ads_parsed': ads_parsed
         }
-        self.request_history.append(record)
+        self._record('error', record)
         
         self.logger.warning(f"❌ Erro registrado para '{keyword_key}' (página {page_num}): {error_type}")
-        self._save_stats()
+
+    def record_delivery(self, keywords, ads_delivered):
+        """Registra anúncios novos entregues para um conjunto (rendimento, fora do histórico de requests)"""
+        if not ads_delivered:
+            return
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'keywords': self._get_keyword_set_key(keywords),
+            'ads_delivered': ads_delivered
+        }
+        self._record('delivery', record)
     
     def get_stats_by_keyword_set(self, keywords=None):
         """Retorna estatísticas para um conjunto específico ou todos"""
         if keywords:
             keyword_key = self._get_keyword_set_key(keywords)
-            success = self.success_counters.get(keyword_key, 0)
-            errors = self.error_counters.get(keyword_key, 0)
-            total = success + errors
-            success_rate = (success / total * 100) if total > 0 else 0
-            
-            return {
+            return dict(self._keyword_stats.get(keyword_key) or {
                 'keyword_set': keyword_key,
-                'success_count': success,
-                'error_count': errors,
-                'total_requests': total,
-                'success_rate': round(success_rate, 2)
-            }
+                'success_count': 0,
+                'error_count': 0,
+                'total_requests': 0,
+                'success_rate': 0
+            })
         else:
-            # Retorna stats de todos os conjuntos
-            all_sets = set(list(self.success_counters.keys()) + list(self.error_counters.keys()))
-            return {keyword_set: self.get_stats_by_keyword_set(keyword_set.split('|')) 
-                   for keyword_set in all_sets}
+            # Retorna stats de todos os conjuntos (já pré-calculadas)
+            return dict(self._keyword_stats)
     
     def get_overall_stats(self):
         """Retorna estatísticas gerais dos últimos N requests"""
-        if not self.request_history:
-            return {
-                'total_requests': 0,
-                'success_count': 0,
-                'error_count': 0,
-                'success_rate': 0,
-                'history_size': 0,
-                'max_history': self.max_history
-            }
-        
-        # Analisa apenas o histórico recente (últimos max_history requests)
-        recent_requests = list(self.request_history)
-        success_count = sum(1 for r in recent_requests if r['status'] == 'success')
-        error_count = sum(1 for r in recent_requests if r['status'] == 'error')
-        total = len(recent_requests)
+        success_count = self._history_success
+        error_count = self._history_error
+        total = len(self.request_history)
         success_rate = (success_count / total * 100) if total > 0 else 0
         
         return {
@@ -156,34 +598,52 @@ class RequestStats:
             'success_count': success_count,
             'error_count': error_count,
             'success_rate': round(success_rate, 2),
-            'history_size': len(self.request_history),
+            'history_size': total,
             'max_history': self.max_history
         }
     
     def get_recent_errors(self, limit=10):
-        """Retorna os erros mais recentes"""
-        recent_errors = [r for r in reversed(self.request_history) if r['status'] == 'error']
-        return recent_errors[:limit]
+        """Retorna os erros mais recentes (do mais novo ao mais antigo) entre os do histórico"""
+        return list(itertools.islice(reversed(self._recent_errors), max(0, int(limit))))
+    
+    def get_yield_counters(self, keywords):
+        """Contadores brutos de custo/rendimento de um conjunto (zerados se nunca raspado)"""
+        counters = self.yield_counters.get(self._get_keyword_set_key(keywords))
+        return dict(counters) if counters else dict.fromkeys(YIELD_FIELDS, 0)
+
+    def get_yield_stats(self):
+        """Custo e rendimento por conjunto de palavras-chave e no total"""
+        totals = dict.fromkeys(YIELD_FIELDS, 0)
+        by_keyword_set = {}
+        for keyword_key, counters in self.yield_counters.items():
+            by_keyword_set[keyword_key] = dict(yield_summary(counters), keyword_set=keyword_key)
+            for field in YIELD_FIELDS:
+                totals[field] += counters[field]
+        return {'by_keyword_set': by_keyword_set, 'totals': yield_summary(totals)}
+
+    def get_window_stats(self):
+        """Retorna contagens, tipos de erro, latências (p50/p95/p99) e bytes por janela"""
+        now = time.time()
+        return {name: window.summary(now) for name, window in self.windows.items()}
     
     def get_stats_summary(self):
         """Retorna um resumo completo das estatísticas"""
-        overall = self.get_overall_stats()
-        by_keyword = self.get_stats_by_keyword_set()
-        recent_errors = self.get_recent_errors(5)
-        
-        return {
-            'overall': overall,
-            'by_keyword_set': by_keyword,
-            'recent_errors': recent_errors,
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        }
+        # Lock: o resumo pode ser montado por outra thread (publicação do estado)
+        with self._lock:
+            return {
+                'overall': self.get_overall_stats(),
+                'by_keyword_set': self.get_stats_by_keyword_set(),
+                'recent_errors': self.get_recent_errors(5),
+                'windows': self.get_window_stats(),
+                'yield': self.get_yield_stats(),
+                'version': self.version,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
     
     def reset_stats(self):
         """Reseta todas as estatísticas (use com cuidado!)"""
-        self.success_counters.clear()
-        self.error_counters.clear()
-        self.request_history.clear()
-        self._save_stats()
+        self._record('reset')
+        self.flush()
         self.logger.warning("⚠️ Todas as estatísticas foram resetadas!")
     
     def export_stats(self, export_file=None):
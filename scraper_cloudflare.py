@@ -1,3 +1,4 @@
+import logging
 import requests
 import time
 import random
@@ -7,7 +8,12 @@ import cloudscraper
 from fake_useragent import UserAgent
 import json
 from itertools import permutations
-from logging_config import get_logger
+from logging_config import get_logger, log_event, LogSampler
+from metrics import SCRAPE_REQUESTS, FETCH_DURATION, PARSE_DURATION, proxy_label
+from tracing import span
+
+# Links sem URL/título aparecem aos montes quando o layout muda: registra 1 a cada N
+INVALID_LINK_SAMPLER = LogSampler(100)
 
 # Custom Exception for when no ads are found
 class NoAdsFoundError(Exception):
@@ -18,7 +24,9 @@ class MarketRoxoScraperCloudflare:
     def __init__(self, base_url, proxies=""):
         """Initializes the scraper with the base URL and headers."""
         self.base_url = base_url
+        self.last_metrics = {}
         self.proxies = self._setup_proxies(proxies)
+        self.proxy_label = proxy_label(self.proxies)
 
         # Inicializa o cloudscraper que bypassa Cloudflare automaticamente
         self.scraper = cloudscraper.create_scraper(
@@ -97,11 +105,24 @@ class MarketRoxoScraperCloudflare:
         query = "+".join(unique_keywords)
         return query
 
+    def _add_metric(self, name, value):
+        self.last_metrics[name] = self.last_metrics.get(name, 0) + value
+
+    def _sleep(self, delay, reason):
+        """Espera registrada no trace e somada ao custo da chamada (last_metrics)"""
+        with span("sleep", reason=reason, seconds=round(delay, 1)):
+            time.sleep(delay)
+        self._add_metric('sleep_duration', delay)
+
     def _random_delay(self):
         """Delay aleatório entre requests."""
         delay = random.uniform(self.delay_min, self.delay_max)
         self.logger.info(f"⏳ Aguardando {delay:.1f}s...")
-        time.sleep(delay)
+        self._sleep(delay, "page_delay")
+
+    def _retry_sleep(self, delay_min, delay_max):
+        """Espera entre tentativas de uma página (registrada no trace)"""
+        self._sleep(random.uniform(delay_min, delay_max), "page_retry")
 
     def _make_request(self, url, max_retries=3):
         """Faz request com retry e bypass Cloudflare."""
@@ -110,7 +131,11 @@ class MarketRoxoScraperCloudflare:
                 headers = self._get_random_headers()
                 self.scraper.headers.update(headers)
 
-                response = self.scraper.get(url, proxies=self.proxies, timeout=30)
+                self._add_metric('requests', 1)
+                with span("request", attempt=attempt + 1, proxy=self.proxy_label) as request_span:
+                    response = self.scraper.get(url, proxies=self.proxies, timeout=30)
+                    request_span.set_tag("status", response.status_code)
+                SCRAPE_REQUESTS.labels(status=response.status_code, proxy=self.proxy_label).inc()
                 response.raise_for_status()
 
                 if "cloudflare" in response.text.lower() and "blocked" in response.text.lower():
@@ -120,9 +145,11 @@ class MarketRoxoScraperCloudflare:
                 return response
 
             except Exception as e:
+                if not isinstance(e, requests.exceptions.HTTPError):
+                    SCRAPE_REQUESTS.labels(status=type(e).__name__, proxy=self.proxy_label).inc()
                 self.logger.error(f"❌ Tentativa {attempt + 1} falhou para {url}: {str(e)}")
                 if attempt < max_retries - 1:
-                    time.sleep(random.uniform(10, 60))
+                    self._sleep(random.uniform(10, 60), "request_retry")
                     self.scraper = cloudscraper.create_scraper(
                         browser={
                             'browser': random.choice(['chrome', 'firefox']),
@@ -202,29 +229,27 @@ class MarketRoxoScraperCloudflare:
         Returns:
             list: List of valid ads found
         """
-        debug = False
         ads = []
 
-        if debug:
-            self._log_debug_info(soup, keywords, negative_keywords_list, page_url)
+        self._log_debug_info(soup, keywords, negative_keywords_list, page_url)
 
-        found_links = self._find_ad_links(soup, debug)
+        found_links = self._find_ad_links(soup)
         if not found_links:
             self._handle_no_ads_found(soup)
             return ads
 
-        if debug:
-            self.logger.info(f"🔗 Total de links de anúncios encontrados para processar: {len(found_links)}")
+        total_links = len(found_links)
+        log_event(logging.DEBUG, "🔗 Total de links de anúncios encontrados para processar: {total}", total=total_links)
 
+        parsed_count = 0
         positive_matches_count = 0
         negative_matches_count = 0
         not_valid_or_invalid_count = 0
 
         for i, link in enumerate(found_links):
-            if debug:
-                self.logger.info(f"--- Processando link {i+1}/{len(found_links)} ---")
+            log_event(logging.DEBUG, "--- Processando link {index}/{total} ---", index=i + 1, total=total_links)
 
-            ad_url, ad_title, ad_price = self._extract_ad_details(link, debug)
+            ad_url, ad_title, ad_price = self._extract_ad_details(link)
 
             if not ad_url or not ad_title:
                 self._handle_invalid_ad(link, ad_url, ad_title)
@@ -232,48 +257,45 @@ class MarketRoxoScraperCloudflare:
                 continue
 
             match_positive, match_negative = self._check_keyword_matches(
-                ad_title, keywords, negative_keywords_list, debug
+                ad_title, keywords, negative_keywords_list
             )
 
+            parsed_count += 1
             positive_matches_count += 1 if match_positive else 0
             negative_matches_count += 1 if match_negative else 0
 
             if match_positive and not match_negative:
                 full_url = urljoin(self.base_url, ad_url)
                 ads.append({"title": ad_title, "url": full_url, "price": ad_price})
-                if debug:
-                    self.logger.info(f"➡️ Anúncio VÁLIDO adicionado: '{ad_title}' - Preço: '{ad_price}'")
+                log_event(logging.DEBUG, "➡️ Anúncio VÁLIDO adicionado: '{title}' - Preço: '{price}'",
+                          title=ad_title, price=ad_price)
             else:
                 not_valid_or_invalid_count += 1
-                if debug:
-                    self.logger.info("🚫 Anúncio IGNORADO (não atendeu aos critérios de correspondência positiva e/ou negativa).")
+                log_event(logging.DEBUG, "🚫 Anúncio IGNORADO (não atendeu aos critérios de correspondência positiva e/ou negativa).")
 
         self._log_extraction_summary(
             len(ads), positive_matches_count, negative_matches_count, not_valid_or_invalid_count
         )
+        self._add_metric('ads_parsed', parsed_count)
 
         return ads
 
-    def _check_keyword_matches(self, ad_title, keywords, negative_keywords_list, debug=False):
+    def _check_keyword_matches(self, ad_title, keywords, negative_keywords_list):
         """Check for positive and negative keyword matches"""
         ad_title_lower = ad_title.lower()
         match_positive = any(keyword.lower() in ad_title_lower for keyword in keywords)
         match_negative = any(negative.lower() in ad_title_lower for negative in negative_keywords_list or [])
 
-        if debug:
-            if match_positive:
-                self.logger.info(f"✅ Título '{ad_title}' CORRESPONDE a uma palavra-chave POSITIVA.")
-            else:
-                self.logger.info(f"❌ Título '{ad_title}' NÃO CORRESPONDE a nenhuma palavra-chave POSITIVA.")
-
-            if match_negative:
-                self.logger.info(f"❌ Título '{ad_title}' CORRESPONDE a uma palavra-chave NEGATIVA.")
-            else:
-                self.logger.info(f"✅ Título '{ad_title}' NÃO CORRESPONDE a nenhuma palavra-chave NEGATIVA.")
+        log_event(logging.DEBUG, "{icon} Título '{title}' {verb} palavra-chave POSITIVA.",
+                  icon="✅" if match_positive else "❌", title=ad_title,
+                  verb="CORRESPONDE a uma" if match_positive else "NÃO CORRESPONDE a nenhuma")
+        log_event(logging.DEBUG, "{icon} Título '{title}' {verb} palavra-chave NEGATIVA.",
+                  icon="❌" if match_negative else "✅", title=ad_title,
+                  verb="CORRESPONDE a uma" if match_negative else "NÃO CORRESPONDE a nenhuma")
 
         return match_positive, match_negative
 
-    def _find_ad_links(self, soup, debug=False):
+    def _find_ad_links(self, soup):
         """Find ad links in the page using multiple possible selectors"""
         selectors = [
             "a[data-testid='ad-card-link']",
@@ -286,8 +308,7 @@ class MarketRoxoScraperCloudflare:
         for selector in selectors:
             links = soup.select(selector)
             if links:
-                if debug:
-                    self.logger.info(f"🔍 Usando seletor: {selector} ({len(links)} links)")
+                log_event(logging.DEBUG, "🔍 Usando seletor: {selector} ({count} links)", selector=selector, count=len(links))
                 return links
 
         return []
@@ -298,7 +319,7 @@ class MarketRoxoScraperCloudflare:
         with open("debug_no_ads.html", "w", encoding="utf-8") as f:
             f.write(str(soup))
 
-    def _extract_ad_details(self, link, debug=False):
+    def _extract_ad_details(self, link):
         """Extract URL, title and price from an ad link"""
         ad_url = link.get("href")
         ad_title = (
@@ -355,12 +376,11 @@ class MarketRoxoScraperCloudflare:
                     if price_element:
                         ad_price = price_element.get_text(strip=True)
                         if ad_price and "R$" in ad_price:
-                            if debug:
-                                self.logger.info(f"✅ Preço encontrado com seletor '{selector}': '{ad_price}'")
+                            log_event(logging.DEBUG, "✅ Preço encontrado com seletor '{selector}': '{price}'",
+                                      selector=selector, price=ad_price)
                             break
                 except Exception as e:
-                    if debug:
-                        self.logger.info(f"❌ Erro ao processar seletor '{selector}': {e}")
+                    log_event(logging.DEBUG, "❌ Erro ao processar seletor '{selector}': {error}", selector=selector, error=e)
                     continue
         
         # Strategy 2: If still no price, look for any element containing R$ in the containers
@@ -373,32 +393,31 @@ class MarketRoxoScraperCloudflare:
                         clean_price = str(price_text).strip()
                         if clean_price and clean_price.startswith('R$'):
                             ad_price = clean_price
-                            if debug:
-                                self.logger.info(f"✅ Preço encontrado por busca de texto: '{ad_price}'")
+                            log_event(logging.DEBUG, "✅ Preço encontrado por busca de texto: '{price}'", price=ad_price)
                             break
                 if ad_price:
                     break
 
-        if debug:
-            self.logger.info(f"URL do anúncio: {ad_url}")
-            self.logger.info(f"Título do anúncio (processado): '{ad_title}'")
-            self.logger.info(f"Preço do anúncio final: '{ad_price}'")
+        log_event(logging.DEBUG, "URL do anúncio: {url} | Título (processado): '{title}' | Preço final: '{price}'",
+                  url=ad_url, title=ad_title, price=ad_price)
 
         return ad_url, ad_title, ad_price
 
     def _handle_invalid_ad(self, link, ad_url, ad_title):
         """Handle invalid ads (missing URL or title)"""
-        if not ad_url:
-            self.logger.warning(f"⚠️ Link sem URL: {link.prettify().strip()}")
-        if not ad_title:
-            self.logger.warning(f"⚠️ Link sem título detectável: {link.prettify().strip()}")
+        # O HTML do link só é serializado se o registro for de fato gravado
+        problems = [text for missing, text in ((not ad_url, "sem URL"), (not ad_title, "sem título detectável")) if missing]
+        problem = " e ".join(problems)
+        log_event(logging.WARNING, "⚠️ Link {problem}: {html}", sampler=INVALID_LINK_SAMPLER,
+                  problem=problem, html=lambda: link.prettify().strip())
 
     def _log_debug_info(self, soup, keywords, negative_keywords_list, page_url):
         """Log debug information about the extraction process"""
-        self.logger.info(f"🔍 Iniciando extração de anúncios da página: {page_url}")
-        self.logger.info(f"📌 Palavras-chave positivas: {keywords}")
-        self.logger.info(f"📌 Palavras-chave negativas: {negative_keywords_list or 'Nenhuma'}")
-        self.logger.info(f"📄 Tamanho do HTML: {len(str(soup))} caracteres")
+        # Resumo da página continua em INFO; o tamanho do HTML (str(soup) é caro) só em DEBUG
+        log_event(logging.INFO, "🔍 Iniciando extração de anúncios da página: {url}", url=page_url)
+        log_event(logging.INFO, "📌 Palavras-chave positivas: {keywords}", keywords=keywords)
+        log_event(logging.INFO, "📌 Palavras-chave negativas: {keywords}", keywords=negative_keywords_list or 'Nenhuma')
+        log_event(logging.DEBUG, "📄 Tamanho do HTML: {size} caracteres", size=lambda: len(str(soup)))
 
     def _log_found_ad_to_file(self, page_url, ad_title, ad_url):
         """Logs found ads to a secondary file."""
@@ -422,6 +441,10 @@ class MarketRoxoScraperCloudflare:
         search_query = self._build_query(query_keywords or keywords)
         collected_ads = []
 
+        # Custos desta chamada (tempos, bytes, requests, esperas, anúncios lidos), lidos pelo Monitor
+        self.last_metrics = {'fetch_duration': 0.0, 'parse_duration': 0.0, 'response_bytes': 0,
+                             'requests': 0, 'sleep_duration': 0.0, 'ads_parsed': 0}
+
         self.logger.info(f"🚀 Iniciando scrape para: {search_query} (query keywords) a partir da página {start_page} por {num_pages_to_scrape} páginas.")
 
         for page_offset in range(num_pages_to_scrape):
@@ -435,15 +458,27 @@ class MarketRoxoScraperCloudflare:
             current_page_success = False
             for attempt in range(page_retry_attempts):
                 try:
-                    response = self._make_request(url)
+                    fetch_start = time.perf_counter()
+                    with span("fetch", page=page_num, url=url, proxy=self.proxy_label) as fetch_span:
+                        response = self._make_request(url)
+                        if response is not None:
+                            fetch_span.set_tag("status", response.status_code)
+                            fetch_span.set_tag("bytes", len(response.content))
+                    fetch_duration = time.perf_counter() - fetch_start
+                    self.last_metrics['fetch_duration'] += fetch_duration
+                    FETCH_DURATION.observe(fetch_duration)
 
                     if response is None:
                         self.logger.error(f"🛑 Tentativa {attempt + 1}/{page_retry_attempts} falhou para obter resposta para a página {page_num}. URL: {url}")
                         if attempt < page_retry_attempts - 1:
-                            time.sleep(random.uniform(page_retry_delay_min, page_retry_delay_max))
+                            self._retry_sleep(page_retry_delay_min, page_retry_delay_max)
                         continue
 
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    self.last_metrics['response_bytes'] += len(response.content)
+                    parse_start = time.perf_counter()
+                    with span("parse", bytes=len(response.content)):
+                        soup = BeautifulSoup(response.text, 'html.parser')
+                    parse_duration = time.perf_counter() - parse_start
 
                     if save_page:
                         debug_filename = f"debug_page_{page_num}.html"
@@ -460,7 +495,13 @@ class MarketRoxoScraperCloudflare:
                         # Combine and deduplicate
                         keywords = list(set(keywords_list + positive_keywords_list))
 
-                    new_ads = self._extract_ads(soup, keywords, negative_keywords_list, page_url=url)
+                    parse_start = time.perf_counter()
+                    with span("extract") as extract_span:
+                        new_ads = self._extract_ads(soup, keywords, negative_keywords_list, page_url=url)
+                        extract_span.set_tag("ads", len(new_ads))
+                    parse_duration += time.perf_counter() - parse_start
+                    self.last_metrics['parse_duration'] += parse_duration
+                    PARSE_DURATION.observe(parse_duration)
 
                     if no_ads_message_found:
                         self.logger.info(f"🔚 Página {page_num} indica fim dos anúncios ou nenhum resultado. URL: {url}")
@@ -486,7 +527,7 @@ class MarketRoxoScraperCloudflare:
                 except NoAdsFoundError as e:
                     self.logger.error(f"💥 NoAdsFoundError na página {page_num} (Tentativa {attempt + 1}/{page_retry_attempts}): {e}")
                     if attempt < page_retry_attempts - 1:
-                        time.sleep(random.uniform(page_retry_delay_min, page_retry_delay_max))
+                        self._retry_sleep(page_retry_delay_min, page_retry_delay_max)
                     else:
                         raise e
                 except requests.exceptions.HTTPError as http_err:
@@ -497,7 +538,7 @@ class MarketRoxoScraperCloudflare:
                             f.write(http_err.response.text)
                         self.logger.info(f"HTML do erro HTTP salvo em: {debug_filename}.")
                     if attempt < page_retry_attempts - 1:
-                        time.sleep(random.uniform(page_retry_delay_min, page_retry_delay_max))
+                        self._retry_sleep(page_retry_delay_min, page_retry_delay_max)
                     else:
                         raise http_err
                 except Exception as e:
@@ -509,7 +550,7 @@ class MarketRoxoScraperCloudflare:
                                 f.write(response.text)
                             self.logger.info(f"HTML salvo em: {debug_filename}")
                     if attempt < page_retry_attempts - 1:
-                        time.sleep(random.uniform(page_retry_delay_min, page_retry_delay_max))
+                        self._retry_sleep(page_retry_delay_min, page_retry_delay_max)
                     else:
                         raise e
 
@@ -1,17 +1,22 @@
-from flask import Flask, Response, request, render_template, send_file, jsonify
+from flask import Flask, Response, request, render_template, send_file, jsonify, stream_with_context
 from functools import wraps
 import os
 import fcntl
 import psutil
 from dotenv import load_dotenv
 import json
-from monitor import Monitor
-from scraper_cloudflare import MarketRoxoScraperCloudflare
-from telegram_bot import TelegramBot
-import zipfile
-import io
+import time
+from ad_store import AdStore
+from config_store import ConfigStore
+from monitor_daemon import MonitorClient, build_monitor, apply_monitor_config
 from datetime import datetime, timezone, timedelta
 from logging_config import setup_4hour_rotation, get_logger, force_log_rotation
+from log_reader import tail_log, list_log_files, parse_log_time, stream_zip, open_log, is_compressed
+from log_index import search_logs
+from profiler import DEFAULT_PROFILE_RATE, MAX_PROFILE_SECONDS, ProfilerBusyError, profile_process
+from tracing import read_traces, trace_summary
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, read_published_metrics, render_local_metrics
+from shared_state import MONITOR_STATE, read_monitor_state
 # setup_logging, setup_frequent_rotation, setup_hourly_rotation
 from concurrent_log_handler import ConcurrentRotatingFileHandler
 
@@ -45,21 +50,14 @@ load_dotenv()
 CONFIG_FILE_PATH = 'config.json'
 LOGS_DIR = 'logs'
 LOCK_FILE = 'monitor.lock'
+CONFIG_STORE = ConfigStore(CONFIG_FILE_PATH)
 
 def load_dynamic_config():
-    try:
-        if os.path.exists(CONFIG_FILE_PATH):
-            with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        get_logger().error(f"Erro ao carregar config.json: {e}")
-        return {}
+    return CONFIG_STORE.load()
 
 def save_dynamic_config(data):
     try:
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        CONFIG_STORE.save(data)
         get_logger().info("Configurações salvas em config.json")
     except Exception as e:
         get_logger().error(f"Erro ao salvar config.json: {e}")
@@ -97,6 +95,30 @@ PROXIES = {
 # Variável do monitor
 monitor = None
 lock_file_handle = None
+ad_store = None
+
+# Com MONITOR_DAEMON=1 o monitor roda em processo próprio (monitor_daemon.py)
+# e os workers apenas enviam comandos pelo socket Unix
+USE_MONITOR_DAEMON = os.getenv("MONITOR_DAEMON", "0") == "1"
+monitor_client = MonitorClient() if USE_MONITOR_DAEMON else None
+
+# SSE do painel de saúde: duração de cada conexão (abaixo do timeout do gunicorn)
+HEALTH_STREAM_SECONDS = int(os.getenv("HEALTH_STREAM_SECONDS", "25"))
+HEALTH_STREAM_RETRY_MS = 1000
+HEALTH_STREAM_POLL = 1
+HEALTH_STREAM_PING = 10
+
+# Campos aceitos em /health/yield?sort=
+YIELD_SORT_FIELDS = ('new_per_request', 'new_per_mb', 'new_per_minute', 'requests', 'ads_delivered', 'wall_time')
+
+def daemon_command(command, success_status=200, **args):
+    """Envia um comando ao daemon do monitor e converte a resposta em JSON/HTTP"""
+    try:
+        response = monitor_client.send(command, **args)
+    except OSError as e:
+        get_logger().error(f"Daemon do monitor indisponível: {str(e)}")
+        return jsonify({"error": f"Daemon do monitor indisponível: {str(e)}"}), 503
+    return jsonify(response), success_status if response.get('ok') else 500
 
 def acquire_lock():
     """Tenta adquirir o lock file e armazena o PID do processo atual"""
@@ -223,13 +245,16 @@ def admin():
         token=current_config.get("token", TELEGRAM_TOKEN),
         chat_input=current_config.get("chat_input", CHAT_INPUT),
         interval_monitor=current_config.get("interval_monitor", 30),
+        interval_min=current_config.get("interval_min"),
+        interval_max=current_config.get("interval_max"),
         page_depth=current_config.get("page_depth", 3),
         retry_attempts=current_config.get("retry_attempts", 100),
         min_repeat_time=current_config.get("min_repeat_time", 15),
         max_repeat_time=current_config.get("max_repeat_time", 67),
         allow_keyword_subsets=current_config.get("allow_subset", False),
+        adaptive_subsets=current_config.get("adaptive_subsets", True),
         send_as_batch=current_config.get("send_as_batch", True),
-        batch_size=current_config.get("batch_size", 1),
+        batch_size=current_config.get("batch_size", 0),
         number_set=current_config.get("number_set", 4),
         min_subset_size=current_config.get("min_subset_size", 3),
         max_subset_size=current_config.get("max_subset_size", len(keywords_list)),
@@ -243,11 +268,47 @@ def health_dashboard():
     """Página de dashboard de saúde"""
     return render_template('health.html', username=USERNAME, password=PASSWORD)
 
+def config_from_request(data):
+    """Monta a configuração do monitor a partir do formulário do painel"""
+    # Parse keywords first to get the correct length
+    keywords_str = data.get('keywords_list', DEFAULT_KEYWORDS)
+    keywords_list = [kw.strip() for kw in keywords_str.split(",") if kw.strip()]
+    
+    return {
+        "keywords": keywords_str,
+        "negative_keywords_list": data.get('negative_keywords_list', NEGATIVE_KEYWORDS),
+        "positive_keywords_list": data.get('positive_keywords_list', POSITIVE_KEYWORDS),
+        "token": data.get('token', TELEGRAM_TOKEN),
+        "chat_input": data.get('chat_input', CHAT_INPUT),
+        "interval_monitor": int(data.get('interval_monitor', 30)),
+        "interval_min": int(data['interval_min']) if data.get('interval_min') else None,
+        "interval_max": int(data['interval_max']) if data.get('interval_max') else None,
+        "page_depth": int(data.get('page_depth', 3)),
+        "retry_attempts": int(data.get('retry_attempts', 100)),
+        "min_repeat_time": int(data.get('min_repeat_time', 15)),
+        "max_repeat_time": int(data.get('max_repeat_time', 67)),
+        "allow_subset": data.get('allow_subset', False),
+        "adaptive_subsets": data.get('adaptive_subsets', True),
+        "send_as_batch": data.get('send_as_batch', True),
+        "batch_size": int(data.get('batch_size') or 0),
+        "min_subset_size": int(data.get('min_subset_size', 3)),
+        "max_subset_size": int(data.get('max_subset_size', len(keywords_list))),
+        "number_set": int(data.get('number_set', 4))
+    }
+
 @app.route('/start', methods=['POST'])
 @requires_auth
 def start():
     global monitor
     
+    if monitor_client:
+        try:
+            config = config_from_request(request.get_json())
+        except Exception as e:
+            return jsonify({"message": f"Erro ao iniciar: {str(e)}"}), 500
+        save_dynamic_config(config)
+        return daemon_command('start', config=config)
+    
     if is_monitor_running():
         get_logger().info("Tentativa de iniciar monitoramento enquanto já está ativo")
         return jsonify({"message": "Monitoramento já está ativo!"}), 400
@@ -257,67 +318,19 @@ def start():
         return jsonify({"message": "Não foi possível iniciar monitoramento - lock ocupado"}), 500
     
     try:
-        data = request.get_json()
-        
-        # Parse keywords first to get the correct length
-        keywords_str = data.get('keywords_list', DEFAULT_KEYWORDS)
-        keywords_list = [kw.strip() for kw in keywords_str.split(",") if kw.strip()]
-        
-        config = {
-            "keywords": keywords_str,
-            "negative_keywords_list": data.get('negative_keywords_list', NEGATIVE_KEYWORDS),
-            "positive_keywords_list": data.get('positive_keywords_list', POSITIVE_KEYWORDS),
-            "token": data.get('token', TELEGRAM_TOKEN),
-            "chat_input": data.get('chat_input', CHAT_INPUT),
-            "interval_monitor": int(data.get('interval_monitor', 30)),
-            "page_depth": int(data.get('page_depth', 3)),
-            "retry_attempts": int(data.get('retry_attempts', 100)),
-            "min_repeat_time": int(data.get('min_repeat_time', 15)),
-            "max_repeat_time": int(data.get('max_repeat_time', 67)),
-            "allow_subset": data.get('allow_subset', False),
-            "send_as_batch": data.get('send_as_batch', True),
-            "batch_size": int(data.get('batch_size', 1)),
-            "min_subset_size": int(data.get('min_subset_size', 3)),
-            "max_subset_size": int(data.get('max_subset_size', len(keywords_list))),
-            "number_set": int(data.get('number_set', 4))
-        }
-        
+        config = config_from_request(request.get_json())
         save_dynamic_config(config)
-        negative_keywords_list = [kw.strip() for kw in config["negative_keywords_list"].split(",") if kw.strip()]
-        positive_keywords_list = [kw.strip() for kw in config["positive_keywords_list"].split(",") if kw.strip()]
-
-        telegram_bot = TelegramBot(token=config["token"])
-        scraper = MarketRoxoScraperCloudflare(
-            base_url=BASE_URL,
-            proxies=PROXIES
-        )
         
-        monitor = Monitor(
-            keywords=keywords_list,
-            negative_keywords_list=negative_keywords_list,
-            positive_keywords_list=positive_keywords_list,
-            scraper=scraper,
-            telegram_bot=telegram_bot,
-            chat_id=config["chat_input"],
-            batch_size=config["batch_size"],
-            number_set=config["number_set"],
-            monitoring_interval=config["interval_monitor"],
-            page_depth=config["page_depth"],
-            retry_attempts=config["retry_attempts"],
-            min_repeat_time=config["min_repeat_time"],
-            max_repeat_time=config["max_repeat_time"],
-            allow_subset=config["allow_subset"],
-            send_as_batch=config["send_as_batch"],
-            min_subset_size=config["min_subset_size"] if len(keywords_list) >= 3 else len(keywords_list),
-            max_subset_size=config["max_subset_size"] if config["max_subset_size"] <= len(keywords_list) else len(keywords_list)
-        )
+        monitor = build_monitor(config, BASE_URL, PROXIES)
         
         if not monitor.start_async():
             release_lock()
             monitor = None
             return jsonify({"message": "Erro ao iniciar monitoramento: já está ativo"}), 500
         
-        get_logger().info(f"Monitoramento iniciado com {len(keywords_list)} palavras-chave")
+        # Alterações salvas por outros workers (/apply-config) chegam pelo mtime do config.json
+        CONFIG_STORE.watch(apply_config_to_local_monitor)
+        get_logger().info(f"Monitoramento iniciado com {len(monitor.keywords)} palavras-chave")
         return jsonify({"message": "Monitoramento iniciado com sucesso!"}), 200
         
     except Exception as e:
@@ -326,12 +339,49 @@ def start():
         monitor = None
         return jsonify({"message": f"Erro ao iniciar: {str(e)}"}), 500
 
+def apply_config_to_local_monitor(config):
+    """Aplica a configuração no monitor deste processo, se ele estiver rodando"""
+    current = get_monitor_instance()
+    if not (current and current.is_running):
+        return None
+    return apply_monitor_config(current, config)
+
+@app.route('/apply-config', methods=['POST'])
+@requires_auth
+def apply_config():
+    """Salva a configuração e aplica no monitor em execução sem reiniciá-lo"""
+    try:
+        config = config_from_request(request.get_json())
+    except Exception as e:
+        return jsonify({"message": f"Configuração inválida: {str(e)}"}), 400
+    save_dynamic_config(config)
+
+    if monitor_client:
+        return daemon_command('reload', config=config)
+
+    try:
+        changed = apply_config_to_local_monitor(config)
+    except Exception as e:
+        get_logger().error(f"Erro ao aplicar configuração: {str(e)}")
+        return jsonify({"message": f"Erro ao aplicar configuração: {str(e)}"}), 500
+    if changed is not None:
+        return jsonify({"message": f"Configuração aplicada sem reiniciar ({len(changed)} campos alterados)",
+                        "applied": True, "changed": changed}), 200
+    if is_monitor_running():
+        # Monitor está em outro worker: ele detecta a mudança do config.json pelo mtime
+        return jsonify({"message": "Configuração salva; o monitor aplica em alguns segundos",
+                        "applied": False}), 202
+    return jsonify({"message": "Configuração salva; será usada no próximo início", "applied": False}), 200
+
 @app.route('/stop', methods=['POST'])
 @requires_auth
 def stop():
     global monitor
     success = True
     
+    if monitor_client:
+        return daemon_command('stop')
+    
     # Force stop local monitor thread first
     if monitor:
         try:
@@ -345,6 +395,7 @@ def stop():
                 else:
                     get_logger().info("Local monitor thread stopped")
             monitor = None
+            CONFIG_STORE.stop_watch()
         except Exception as e:
             get_logger().error(f"Error stopping monitor thread: {e}")
             success = False
@@ -386,6 +437,9 @@ def stop():
 @requires_auth
 def status():
     """Nova rota para verificar o status do monitoramento"""
+    if monitor_client:
+        return daemon_command('status')
+    
     try:
         if is_monitor_running():
             if os.path.exists(LOCK_FILE):
@@ -416,19 +470,92 @@ def status():
 @app.route('/logs')
 @requires_auth
 def logs():
+    """Conteúdo do app.log ou, com ?file=, de um arquivo rotacionado (.gz/.zst descomprimidos)"""
     try:
-        log_file_path = os.path.join(LOGS_DIR, 'app.log')
+        file_name = request.args.get('file', 'app.log')
+        if os.path.basename(file_name) != file_name or not file_name.startswith('app.log'):
+            return jsonify({"message": "Arquivo de log inválido"}), 400
+        log_file_path = os.path.join(LOGS_DIR, file_name)
         if not os.path.exists(log_file_path):
             get_logger().error("Arquivo de log não encontrado")
             return jsonify({"message": "Arquivo de log não encontrado"}), 404
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with open_log(log_file_path) as f:
+            content = f.read().decode('utf-8', errors='replace')
         get_logger().debug("Logs acessados via /logs")
         return Response(content, mimetype='text/plain')
     except Exception as e:
         get_logger().error(f"Erro ao ler logs: {str(e)}")
         return jsonify({"message": f"Erro ao ler logs: {str(e)}"}), 500
 
+@app.route('/logs/files')
+@requires_auth
+def logs_files():
+    """Arquivos de log disponíveis (atual e rotacionados), do mais novo ao mais antigo"""
+    files = []
+    for path in reversed(list_log_files(LOGS_DIR) if os.path.exists(LOGS_DIR) else []):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append({
+            'name': os.path.basename(path),
+            'size': stat.st_size,
+            'modified': stat.st_mtime,
+            'compressed': is_compressed(path)
+        })
+    return jsonify({'files': files})
+
+@app.route('/logs/search')
+@requires_auth
+def logs_search():
+    """Busca nos logs atuais e rotacionados usando o índice por blocos.
+       Filtros: since/until (como no /download-logs), level (nível mínimo),
+       q (texto) e token (tipo de erro ou URL/host exatos)."""
+    try:
+        since = parse_log_time(request.args.get('since'))
+        until = parse_log_time(request.args.get('until'))
+        limit = request.args.get('limit', 200, type=int)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if not (request.args.get('q') or request.args.get('token') or request.args.get('level') or since or until):
+        return jsonify({"message": "Informe ao menos um filtro (q, token, level, since ou until)"}), 400
+
+    try:
+        if not os.path.exists(LOGS_DIR):
+            return jsonify({"message": "Diretório de logs não encontrado"}), 404
+        return jsonify(search_logs(
+            LOGS_DIR,
+            since=since,
+            until=until,
+            min_level=request.args.get('level'),
+            text=request.args.get('q'),
+            token=request.args.get('token'),
+            limit=limit
+        ))
+    except Exception as e:
+        get_logger().error(f"Erro ao buscar nos logs: {str(e)}")
+        return jsonify({"message": f"Erro ao buscar nos logs: {str(e)}"}), 500
+
+@app.route('/logs/tail')
+@requires_auth
+def logs_tail():
+    """Linhas novas do log desde o cursor, com filtros de nível/texto aplicados no servidor"""
+    try:
+        max_bytes = min(max(request.args.get('max_bytes', 256 * 1024, type=int), 1024), 2 * 1024 * 1024)
+        result = tail_log(
+            os.path.join(LOGS_DIR, 'app.log'),
+            cursor=request.args.get('cursor'),
+            max_bytes=max_bytes,
+            min_level=request.args.get('level'),
+            text=request.args.get('q')
+        )
+        if result is None:
+            return jsonify({"message": "Arquivo de log não encontrado"}), 404
+        return jsonify(result)
+    except Exception as e:
+        get_logger().error(f"Erro ao ler logs: {str(e)}")
+        return jsonify({"message": f"Erro ao ler logs: {str(e)}"}), 500
+
 # @app.route('/archive_log', methods=['GET'])
 # @requires_auth
 # def archive_log():
@@ -476,24 +603,27 @@ def archive_log():
 @app.route('/download-logs', methods=['GET'])
 @requires_auth
 def download_logs():
+    """Zip de todos os logs (incluindo app.log.*), gerado em streaming.
+       Aceita ?since= e ?until= ('YYYY-MM-DD[ HH:MM]' em GMT-3 ou epoch)."""
     try:
-        log_files = []
-        if os.path.exists(LOGS_DIR):
-            log_files = [os.path.join(LOGS_DIR, f) for f in os.listdir(LOGS_DIR) if f.endswith('.log')]
-        
+        since = parse_log_time(request.args.get('since'))
+        until = parse_log_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        log_files = list_log_files(LOGS_DIR, since, until) if os.path.exists(LOGS_DIR) else []
+
         if not log_files:
             get_logger().error("Nenhum arquivo de log encontrado")
             return jsonify({'message': 'Nenhum arquivo de log encontrado'}), 404
-        
-        mem_zip = io.BytesIO()
-        with zipfile.ZipFile(mem_zip, 'w') as zf:
-            for log_file in log_files:
-                zf.write(log_file, arcname=os.path.basename(log_file))
-        
-        mem_zip.seek(0)
-        get_logger().info("Logs baixados via /download-logs")
-        return send_file(mem_zip, mimetype='application/zip', 
-                        as_attachment=True, download_name='all_logs.zip')
+
+        get_logger().info(f"Logs baixados via /download-logs ({len(log_files)} arquivos)")
+        return Response(
+            stream_with_context(stream_zip(log_files)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=all_logs.zip'}
+        )
     except Exception as e:
         get_logger().error(f"Erro ao baixar logs: {str(e)}")
         return jsonify({"message": f"Erro ao baixar logs: {str(e)}"}), 500
@@ -511,39 +641,32 @@ def download_hash_file():
     get_logger().info("Arquivo hash baixado via /download-hash-file")
     return send_file(hash_file_path, as_attachment=True)
 
+def health_status(success_rate):
+    """Classifica a saúde geral pela taxa de sucesso"""
+    if success_rate >= 80:
+        return 'healthy'
+    if success_rate >= 60:
+        return 'warning'
+    return 'critical'
+
 @app.route('/health', methods=['GET'])
 @requires_auth
 def health_check():
     """Endpoint de health check com estatísticas de requests"""
     try:
-        monitor = get_monitor_instance()
+        # Estatísticas e status publicados pelo processo do monitor (qualquer worker lê)
+        health_stats = read_monitor_state()
         
-        if monitor is None:
+        if health_stats is None:
             return jsonify({
                 'status': 'error',
                 'message': 'Monitor não inicializado',
                 'stats': None
             }), 500
         
-        # Obtém estatísticas do monitor
-        health_stats = monitor.get_health_stats()
-        
-        # Adiciona informações do status do monitor
-        health_stats['monitor_status'] = {
-            'is_running': monitor.is_running,
-            'thread_alive': monitor.thread.is_alive() if monitor.thread else False
-        }
-        
         # Determina o status geral
-        overall_stats = health_stats['overall']
-        success_rate = overall_stats.get('success_rate', 0)
-        
-        if success_rate >= 80:
-            status = 'healthy'
-        elif success_rate >= 60:
-            status = 'warning'
-        else:
-            status = 'critical'
+        success_rate = health_stats['overall'].get('success_rate', 0)
+        status = health_status(success_rate)
         
         return jsonify({
             'status': status,
@@ -564,24 +687,105 @@ def health_check():
 def detailed_stats():
     """Endpoint com estatísticas detalhadas"""
     try:
-        monitor = get_monitor_instance()
+        health_stats = read_monitor_state()
         
-        if monitor is None:
+        if health_stats is None:
             return jsonify({
                 'error': 'Monitor não inicializado'
             }), 500
         
-        return jsonify(monitor.get_health_stats()), 200
+        return jsonify(health_stats), 200
         
     except Exception as e:
         return jsonify({
             'error': f'Erro ao obter estatísticas: {str(e)}'
         }), 500
 
+@app.route('/health/yield', methods=['GET'])
+@requires_auth
+def yield_stats():
+    """Custo e rendimento por conjunto de palavras-chave (do mais ao menos produtivo)"""
+    sort = request.args.get('sort', 'new_per_request')
+    if sort not in YIELD_SORT_FIELDS:
+        return jsonify({'error': f"Ordenação inválida: {sort} (use {', '.join(YIELD_SORT_FIELDS)})"}), 400
+
+    health_stats = read_monitor_state()
+    if health_stats is None:
+        return jsonify({'error': 'Monitor não inicializado'}), 500
+
+    yield_data = health_stats.get('yield') or {'by_keyword_set': {}, 'totals': None}
+    # Conjuntos sem requests (razão None) vão para o fim
+    keyword_sets = sorted(yield_data['by_keyword_set'].values(),
+                          key=lambda item: (item[sort] is not None, item[sort] or 0), reverse=True)
+    return jsonify({
+        'sort': sort,
+        'totals': yield_data['totals'],
+        'keyword_sets': keyword_sets,
+        'no_yield': [item['keyword_set'] for item in keyword_sets if item['no_yield']]
+    }), 200
+
+def sse_event(event, data, event_id=None):
+    """Formata um evento Server-Sent Events"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/health/stream', methods=['GET'])
+@requires_auth
+def health_stream():
+    """Envia o estado completo uma vez e depois só as chaves que mudaram.
+
+    A conexão é encerrada após HEALTH_STREAM_SECONDS para não prender o worker;
+    o EventSource reconecta sozinho com o Last-Event-ID e, se nada mudou nesse
+    intervalo, não recebe o snapshot de novo.
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def generate():
+        yield f"retry: {HEALTH_STREAM_RETRY_MS}\n\n"
+        deadline = time.monotonic() + HEALTH_STREAM_SECONDS
+        last_ping = time.monotonic()
+        last_sequence = None
+        last_stale = None
+        previous = None
+        while time.monotonic() < deadline:
+            sequence = MONITOR_STATE.sequence
+            state = read_monitor_state()
+            stale = bool(state and state.get('monitor_status', {}).get('stale'))
+            if sequence != last_sequence or stale != last_stale:
+                event_id = f"{sequence}:{int(stale)}"
+                if state is not None:
+                    state = dict(state, status=health_status(state['overall'].get('success_rate', 0)))
+                if previous is None:
+                    if event_id != last_event_id:
+                        yield sse_event('snapshot', state, event_id)
+                    previous = state
+                elif state is not None:
+                    changes = {key: value for key, value in state.items() if previous.get(key) != value}
+                    removed = [key for key in previous if key not in state]
+                    if changes or removed:
+                        yield sse_event('delta', {'changes': changes, 'removed': removed}, event_id)
+                    previous = state
+                last_sequence, last_stale = sequence, stale
+                last_ping = time.monotonic()
+            elif time.monotonic() - last_ping >= HEALTH_STREAM_PING:
+                yield ": ping\n\n"
+                last_ping = time.monotonic()
+            time.sleep(HEALTH_STREAM_POLL)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/health/export', methods=['POST'])
 @requires_auth
 def export_stats():
     """Endpoint para exportar estatísticas"""
+    if monitor_client:
+        return daemon_command('export_stats')
+    
     try:
         monitor = get_monitor_instance()
         
@@ -612,6 +816,9 @@ def export_stats():
 @requires_auth
 def reset_stats():
     """Endpoint para resetar estatísticas (use com cuidado!)"""
+    if monitor_client:
+        return daemon_command('reset_stats')
+    
     try:
         monitor = get_monitor_instance()
         
@@ -632,6 +839,135 @@ def reset_stats():
             'error': f'Erro ao resetar estatísticas: {str(e)}'
         }), 500
 
+def get_ad_store():
+    """AdStore do processo, criado na primeira consulta"""
+    global ad_store
+    if ad_store is None:
+        ad_store = AdStore()
+    return ad_store
+
+@app.route('/ads', methods=['GET'])
+@requires_auth
+def list_ads():
+    """Anúncios entregues, do mais recente ao mais antigo, paginados por cursor.
+       Filtros: keywords, since, until ('YYYY-MM-DD[ HH:MM]' ou epoch), min_price, max_price.
+       until só com a data inclui o dia inteiro."""
+    try:
+        page = get_ad_store().list_ads(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            keywords=request.args.get('keywords'),
+            since=parse_log_time(request.args.get('since')),
+            until=parse_log_time(request.args.get('until'), end_of_day=True),
+            min_price=request.args.get('min_price', type=float),
+            max_price=request.args.get('max_price', type=float)
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        get_logger().error(f"Erro ao consultar anúncios: {str(e)}")
+        return jsonify({"message": f"Erro ao consultar anúncios: {str(e)}"}), 500
+    return jsonify(page), 200
+
+@app.route('/ads/search', methods=['GET'])
+@requires_auth
+def search_ads():
+    """Busca por texto nos títulos (sem acentos), ordenada por relevância (sort=rank) ou data (sort=recent).
+       since/until como em /ads."""
+    try:
+        results = get_ad_store().search(
+            request.args.get('q', ''),
+            limit=request.args.get('limit', 20, type=int),
+            sort=request.args.get('sort', 'rank'),
+            cursor=request.args.get('cursor'),
+            keywords=request.args.get('keywords'),
+            since=parse_log_time(request.args.get('since')),
+            until=parse_log_time(request.args.get('until'), end_of_day=True)
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"message": str(e)}), 503
+    except Exception as e:
+        get_logger().error(f"Erro na busca de anúncios: {str(e)}")
+        return jsonify({"message": f"Erro na busca de anúncios: {str(e)}"}), 500
+    return jsonify(results), 200
+
+@app.route('/ads/<ad_hash>', methods=['GET'])
+@requires_auth
+def get_ad(ad_hash):
+    try:
+        ad = get_ad_store().get_ad(ad_hash)
+    except Exception as e:
+        get_logger().error(f"Erro ao consultar anúncio: {str(e)}")
+        return jsonify({"message": f"Erro ao consultar anúncio: {str(e)}"}), 500
+    if ad is None:
+        return jsonify({"message": "Anúncio não encontrado"}), 404
+    return jsonify(ad), 200
+
+@app.route('/metrics', methods=['GET'])
+@requires_auth
+def metrics():
+    """Exposição OpenMetrics (texto pré-renderizado pelo processo do monitor)"""
+    payload = read_published_metrics()
+    if payload is None:
+        payload = render_local_metrics()
+    return Response(payload, mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/traces', methods=['GET'])
+@requires_auth
+def traces():
+    """Ciclos recentes com o tempo total por etapa (fetch, parse, sleep, envio...)"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'traces': [trace_summary(trace) for trace in read_traces()[:limit]]}), 200
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+@requires_auth
+def trace_detail(trace_id):
+    """Todos os spans de um ciclo, para a linha do tempo do painel"""
+    for trace in read_traces():
+        if trace['trace_id'] == trace_id:
+            return jsonify(trace), 200
+    return jsonify({"message": "Trace não encontrado (fora do buffer recente)"}), 404
+
+@app.route('/debug/profile', methods=['GET'])
+@requires_auth
+def debug_profile():
+    """Amostra as pilhas das threads do processo do monitor por alguns segundos.
+       Parâmetros: seconds (máx. 25), rate (Hz, máx. 250), thread (trecho do nome)
+       e format=json; por padrão devolve pilhas colapsadas para flamegraph."""
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), MAX_PROFILE_SECONDS)
+    rate = request.args.get('rate', DEFAULT_PROFILE_RATE, type=int)
+    thread_filter = request.args.get('thread')
+
+    if monitor_client:
+        # O monitor roda no daemon: a amostragem acontece lá
+        try:
+            client = MonitorClient(monitor_client.socket_path, timeout=seconds + 10)
+            result = client.send('profile', seconds=seconds, rate=rate, thread=thread_filter)
+        except OSError as e:
+            get_logger().error(f"Daemon do monitor indisponível: {str(e)}")
+            return jsonify({"error": f"Daemon do monitor indisponível: {str(e)}"}), 503
+        if not result.get('ok'):
+            return jsonify(result), 409 if result.get('busy') else 500
+    else:
+        if monitor is None and is_monitor_running():
+            # Modo legado com o monitor em outro worker: só as threads deste worker seriam vistas
+            get_logger().warning("⚠️ Profiling em worker sem o monitor; só threads de requisição serão amostradas")
+        try:
+            result = profile_process(seconds, rate, thread_filter)
+        except ProfilerBusyError as e:
+            return jsonify({"message": str(e)}), 409
+
+    get_logger().info(f"🔬 Profiling concluído: {result['samples']} amostras em {seconds:g}s (PID {result['pid']})")
+    if request.args.get('format') == 'json':
+        return jsonify(result), 200
+    return Response(result['collapsed'], mimetype='text/plain', headers={
+        'X-Profile-Samples': str(result['samples']),
+        'X-Profile-Pid': str(result['pid']),
+        'X-Profile-Threads': ",".join(result['threads'])
+    })
+
 # Função de limpeza para quando a aplicação é encerrada
 def cleanup():
     """Limpa recursos quando a aplicação é encerrada"""
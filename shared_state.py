@@ -0,0 +1,172 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from logging_config import get_logger
+
+
+def get_shared_state_dir():
+    """Diretório dos arquivos compartilhados entre processos (memória quando possível)"""
+    shared_dir = os.getenv("SHARED_STATE_DIR")
+    if not shared_dir:
+        if os.path.isdir("/dev/shm"):
+            shared_dir = os.path.join("/dev/shm", "marketroxo")
+        else:
+            shared_dir = os.path.join(os.path.expanduser("~"), ".marketroxo_data", "shared")
+    os.makedirs(shared_dir, exist_ok=True)
+    return shared_dir
+
+
+READ_RETRY_SLEEP = 0.001  # espera entre releituras de um slot sendo escrito
+
+
+class SharedSlot:
+    """Região de memória compartilhada (mmap de arquivo) com um único escritor.
+
+    Usa um seqlock: o escritor incrementa a sequência antes (ímpar = escrevendo)
+    e depois de gravar o conteúdo; leitores repetem a leitura se a sequência
+    mudou no meio. Leituras não usam locks nem chamadas de sistema (só cedem a CPU,
+    por pouco tempo, se pegarem uma escrita em andamento).
+    """
+
+    HEADER = struct.Struct('<QI')  # sequência, tamanho do conteúdo
+
+    def __init__(self, name, size=1024 * 1024):
+        self.path = os.path.join(get_shared_state_dir(), name)
+        self.size = size
+        self._mm = None
+
+    def _map(self):
+        if self._mm is None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < self.size:
+                    os.ftruncate(fd, self.size)
+                self._mm = mmap.mmap(fd, self.size)
+            finally:
+                os.close(fd)
+        return self._mm
+
+    @property
+    def sequence(self):
+        """Número de publicações feitas (muda a cada write)"""
+        return self.HEADER.unpack_from(self._map(), 0)[0] // 2
+
+    def raw_sequence_view(self):
+        """memoryview do contador bruto (ímpar durante escrita); ler view[0] não faz syscall"""
+        return memoryview(self._map())[:8].cast('Q')
+
+    def write(self, payload):
+        mm = self._map()
+        capacity = self.size - self.HEADER.size
+        if len(payload) > capacity:
+            raise ValueError(f"Conteúdo de {len(payload)} bytes excede a capacidade do slot ({capacity})")
+        seq = self.HEADER.unpack_from(mm, 0)[0]
+        if seq % 2:
+            seq += 1  # escritor anterior morreu no meio de uma escrita
+        struct.pack_into('<Q', mm, 0, seq + 1)
+        mm[self.HEADER.size:self.HEADER.size + len(payload)] = payload
+        struct.pack_into('<I', mm, 8, len(payload))
+        struct.pack_into('<Q', mm, 0, seq + 2)
+
+    def read(self, retries=10):
+        """Retorna o último conteúdo publicado (bytes) ou None se nunca publicado
+           (ou se a escrita não terminou depois de retries tentativas)"""
+        mm = self._map()
+        for attempt in range(retries):
+            if attempt:
+                # Escrita em andamento: cede a CPU ao escritor, depois espera um pouco mais
+                time.sleep(0 if attempt < 3 else READ_RETRY_SLEEP)
+            seq, length = self.HEADER.unpack_from(mm, 0)
+            if seq % 2:
+                continue
+            payload = mm[self.HEADER.size:self.HEADER.size + length]
+            if self.HEADER.unpack_from(mm, 0)[0] == seq:
+                return payload if seq else None
+        return None
+
+
+class JsonSlot(SharedSlot):
+    """SharedSlot com conteúdo JSON; cada processo guarda o último parse por sequência"""
+
+    def __init__(self, name, size=4 * 1024 * 1024):
+        super().__init__(name, size)
+        self._cached_sequence = None
+        self._cached_value = None
+
+    def publish(self, value):
+        self.write(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def snapshot(self):
+        """Último valor publicado; só faz parse quando a sequência muda"""
+        sequence = self.sequence
+        if sequence != self._cached_sequence:
+            payload = self.read()
+            self._cached_value = json.loads(payload) if payload else None
+            self._cached_sequence = sequence
+        return self._cached_value
+
+
+class StatePublisher:
+    """Publica periodicamente o snapshot de um objeto num JsonSlot.
+
+    Publica quando version_fn muda ou, no mínimo, a cada heartbeat_interval
+    segundos (o timestamp do heartbeat indica que o processo continua vivo).
+    """
+
+    def __init__(self, slot, snapshot_fn, version_fn=None, interval=1, heartbeat_interval=5):
+        self.slot = slot
+        self.snapshot_fn = snapshot_fn
+        self.version_fn = version_fn
+        self.interval = interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._last_version = None
+        self._last_publish = 0
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="state-publisher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval * 2)
+        self.publish()
+
+    def _run(self):
+        while not self.stop_event.wait(timeout=self.interval):
+            try:
+                version = self.version_fn() if self.version_fn else None
+                if version != self._last_version or time.time() - self._last_publish >= self.heartbeat_interval:
+                    self.publish(version)
+            except Exception as e:
+                get_logger().error(f"❌ Erro ao publicar estado compartilhado: {str(e)}")
+
+    def publish(self, version=None):
+        snapshot = self.snapshot_fn()
+        snapshot['heartbeat'] = time.time()
+        self.slot.publish(snapshot)
+        self._last_version = version if version is not None else (self.version_fn() if self.version_fn else None)
+        self._last_publish = snapshot['heartbeat']
+
+
+# Estado do monitor (estatísticas + status de execução) visível a todos os workers
+MONITOR_STATE = JsonSlot("monitor_state.shm")
+
+
+def read_monitor_state(max_age=30):
+    """Estado publicado pelo processo do monitor; marca como parado se o heartbeat expirou"""
+    state = MONITOR_STATE.snapshot()
+    if state is None:
+        return None
+    if time.time() - state.get('heartbeat', 0) > max_age:
+        state = dict(state)
+        state['monitor_status'] = dict(state.get('monitor_status') or {}, is_running=False, thread_alive=False, stale=True)
+    return state
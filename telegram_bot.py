@@ -1,96 +1,286 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from logging_config import get_logger
+from metrics import TELEGRAM_MESSAGES, SEND_DURATION, QUEUE_DEPTH
 
 class TelegramBot:
-    def __init__(self, token):
+    API_URL = "https://api.telegram.org/bot{token}/{method}"
+
+    # Limites do Telegram: ~1 msg/s por chat privado e ~20 msgs/min por grupo
+    PRIVATE_CHAT_INTERVAL = 1.0
+    GROUP_CHAT_INTERVAL = 3.0
+
+    def __init__(self, token, cache_file=None, pool_maxsize=10, timeout=30):
         self.token = token
         self.MAX_MESSAGE_LENGTH = 4096  # Telegram's character limit
+        self.timeout = timeout
+
+        # Sessão persistente: reaproveita conexões TLS (keep-alive) entre mensagens
+        self.session = self._create_session(pool_maxsize)
+
+        # Envios concorrentes (fan-out) usam no máximo uma conexão do pool por thread
+        self._executor = ThreadPoolExecutor(max_workers=pool_maxsize, thread_name_prefix="telegram")
+        QUEUE_DEPTH.labels(queue="telegram_send").set_function(self._executor._work_queue.qsize)
+        self._rate_lock = threading.Lock()
+        self._next_send_at = {}
+
+        # Cache de identificadores resolvidos (username/telefone -> chat_id)
+        if cache_file is None:
+            data_dir = os.path.join(os.path.expanduser("~"), ".marketroxo_data")
+            os.makedirs(data_dir, exist_ok=True)
+            self.cache_file = os.path.join(data_dir, "telegram_chats.json")
+        else:
+            self.cache_file = cache_file
+
+        self._cache_lock = threading.Lock()
+        self.resolved_identifiers = {}
+        self.known_chats = {}
+        self.updates_offset = 0
+        self._load_cache()
 
     @property
     def logger(self):
         """Property que sempre retorna o logger atualizado"""
         return get_logger()
 
+    def _create_session(self, pool_maxsize):
+        """Cria sessão HTTP com pool de conexões e keep-alive"""
+        session = requests.Session()
+        # Só repete falhas de conexão: repetir leituras/POSTs poderia duplicar mensagens
+        retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def _api_url(self, method):
+        return self.API_URL.format(token=self.token, method=method)
+
+    def _bot_id(self):
+        """Parte pública do token, usada para invalidar o cache ao trocar de bot"""
+        return str(self.token).split(":", 1)[0]
+
+    def _load_cache(self):
+        """Carrega identificadores resolvidos e offset do getUpdates do disco"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('bot_id') != self._bot_id():
+                    self.logger.info("🔁 Cache de chats pertence a outro bot - ignorando")
+                    return
+                self.resolved_identifiers = data.get('resolved_identifiers', {})
+                self.known_chats = data.get('known_chats', {})
+                self.updates_offset = int(data.get('updates_offset', 0))
+                self.logger.info(f"📇 Cache de chats carregado: {len(self.resolved_identifiers)} identificadores, offset {self.updates_offset}")
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao carregar cache de chats: {str(e)}")
+
+    def _save_cache(self):
+        """Salva o cache de forma atômica (arquivo temporário + rename)"""
+        data = {
+            'bot_id': self._bot_id(),
+            'resolved_identifiers': self.resolved_identifiers,
+            'known_chats': self.known_chats,
+            'updates_offset': self.updates_offset
+        }
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao salvar cache de chats: {str(e)}")
+
+    @staticmethod
+    def _normalize_identifier(identifier):
+        """Normaliza username/telefone para a chave usada no cache"""
+        identifier = str(identifier).strip()
+        if identifier.startswith("+"):
+            return "+" + "".join(c for c in identifier if c.isdigit())
+        return "@" + identifier.lstrip("@").lower()
+
+    @staticmethod
+    def _is_chat_id(identifier):
+        """Chat IDs são numéricos (grupos usam IDs negativos)"""
+        return isinstance(identifier, (int, str)) and str(identifier).strip().lstrip("-").isdigit()
+
+    def _poll_updates(self):
+        """Busca apenas as atualizações novas desde o último offset e indexa os chats"""
+        response = self.session.get(
+            self._api_url("getUpdates"),
+            params={"offset": self.updates_offset} if self.updates_offset else None,
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            self.logger.error(f"Erro ao obter atualizações: {response.text}")
+            raise Exception(f"Erro ao obter atualizações: {response.text}")
+
+        updates = response.json().get("result", [])
+        if not updates:
+            return 0
+
+        for update in updates:
+            message = update.get("message")
+            if message and "chat" in message:
+                chat = message["chat"]
+                chat_id = chat["id"]
+                user_info = self.known_chats.get(str(chat_id), {
+                    "chat_id": chat_id,
+                    "username": chat.get("username", "N/A"),
+                    "first_name": chat.get("first_name", "N/A"),
+                    "phone_number": "N/A"
+                })
+                if chat.get("username"):
+                    user_info["username"] = chat["username"]
+                    self.resolved_identifiers[self._normalize_identifier(chat["username"])] = chat_id
+                if "contact" in message and message["contact"].get("phone_number"):
+                    phone = message["contact"]["phone_number"]
+                    user_info["phone_number"] = phone
+                    self.resolved_identifiers[self._normalize_identifier("+" + phone.lstrip("+"))] = chat_id
+                self.known_chats[str(chat_id)] = user_info
+
+        # Offset confirma as atualizações já processadas; próximas buscas são incrementais
+        self.updates_offset = max(update["update_id"] for update in updates) + 1
+        self._save_cache()
+        return len(updates)
+
+    def resolve_chat_id(self, identifier):
+        """Resolve chat ID, telefone ou username para um chat_id usando o cache"""
+        if self._is_chat_id(identifier):
+            return str(identifier).strip()
+
+        key = self._normalize_identifier(identifier)
+        with self._cache_lock:
+            chat_id = self.resolved_identifiers.get(key)
+            if chat_id is None:
+                self._poll_updates()
+                chat_id = self.resolved_identifiers.get(key)
+
+        if not chat_id:
+            self.logger.error(
+                "Identificador não encontrado. O usuário deve iniciar uma conversa com o bot primeiro.")
+            raise ValueError(
+                "Identificador não encontrado. O usuário deve iniciar uma conversa com o bot primeiro.")
+        return chat_id
+
+    @staticmethod
+    def message_length(text):
+        """Tamanho do texto como o Telegram conta (unidades UTF-16, emojis contam 2)"""
+        return len(text.encode('utf-16-le')) // 2
+
+    def split_text(self, text):
+        """Divide o texto em partes dentro do limite, cortando em quebras de linha.
+           Só corta no meio de uma linha quando ela sozinha excede o limite."""
+        if self.message_length(text) <= self.MAX_MESSAGE_LENGTH:
+            return [text]
+
+        chunks = []
+        current = ""
+        for line in text.splitlines(keepends=True):
+            if self.message_length(current + line) <= self.MAX_MESSAGE_LENGTH:
+                current += line
+                continue
+            if current:
+                chunks.append(current)
+                current = ""
+            while self.message_length(line) > self.MAX_MESSAGE_LENGTH:
+                cut = self.MAX_MESSAGE_LENGTH
+                while self.message_length(line[:cut]) > self.MAX_MESSAGE_LENGTH:
+                    cut -= 1
+                chunks.append(line[:cut])
+                line = line[cut:]
+            current = line
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _reserve_send_slot(self, chat_id):
+        """Reserva o próximo horário de envio permitido para o chat e retorna a espera (s)"""
+        interval = self.GROUP_CHAT_INTERVAL if str(chat_id).startswith("-") else self.PRIVATE_CHAT_INTERVAL
+        with self._rate_lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_send_at.get(str(chat_id), 0))
+            self._next_send_at[str(chat_id)] = send_at + interval
+        return send_at - now
+
+    def _post_chunk(self, chat_id, chunk):
+        """Envia um pedaço de mensagem; levanta exceção em caso de erro da API"""
+        params = {"chat_id": chat_id, "text": chunk}
+        send_start = time.perf_counter()
+        response = self.session.post(self._api_url("sendMessage"), data=params, timeout=self.timeout)
+        SEND_DURATION.observe(time.perf_counter() - send_start)
+        TELEGRAM_MESSAGES.labels(status="ok" if response.status_code == 200 else response.status_code).inc()
+
+        if response.status_code != 200:
+            error_text = response.text
+            if "chat not found" in error_text.lower() or "identificador não encontrado" in error_text.lower():
+                self.logger.error("❌ TELEGRAM: Inicie uma conversa com o bot primeiro enviando /start")
+            else:
+                self.logger.error(f"❌ Erro ao enviar mensagem: {error_text}")
+            raise Exception(error_text)
+        else:
+            self.logger.info(f"Mensagem enviada com sucesso: {chunk[:18]}...")
+
     def send_message(self, identifier, text):
         """Sends message to a chat ID, phone number, or username (if valid).
            Splits long messages into multiple messages."""
-        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        chat_id = self.resolve_chat_id(identifier)
 
-        if isinstance(identifier, (int, str)) and str(identifier).isdigit():
-            chat_id = identifier
-        else:
-            updates = requests.get(
-                f"https://api.telegram.org/bot{self.token}/getUpdates").json()
-            chat_id = None
-
-            for update in updates.get("result", []):
-                if "message" in update and "chat" in update["message"]:
-                    chat = update["message"]["chat"]
-                    if identifier.startswith("+") and "contact" in update["message"]:
-                        if update["message"]["contact"]["phone_number"] == identifier:
-                            chat_id = chat["id"]
-                            break
-                    elif identifier.startswith("@") and chat.get("username") == identifier:
-                        chat_id = chat["id"]
-                        break
-                    elif chat.get("username") == f"@{identifier}" or chat.get("username") == identifier:
-                        chat_id = chat["id"]
-                        break
-
-            if not chat_id:
-                self.logger.error(
-                    "Identificador não encontrado. O usuário deve iniciar uma conversa com o bot primeiro.")
-                raise ValueError(
-                    "Identificador não encontrado. O usuário deve iniciar uma conversa com o bot primeiro.")
-        
         # Split the message if it's too long
-        message_chunks = [text[i:i + self.MAX_MESSAGE_LENGTH] 
-                          for i in range(0, len(text), self.MAX_MESSAGE_LENGTH)]
+        message_chunks = self.split_text(text)
 
         for chunk in message_chunks:
-            params = {"chat_id": chat_id, "text": chunk}
-            response = requests.post(url, params=params)
-
-            if response.status_code != 200:
-                error_text = response.text
-                if "chat not found" in error_text.lower() or "identificador não encontrado" in error_text.lower():
-                    self.logger.error("❌ TELEGRAM: Inicie uma conversa com o bot primeiro enviando /start")
-                else:
-                    self.logger.error(f"❌ Erro ao enviar mensagem: {error_text}")
-                raise Exception(error_text)
-            else:
-                self.logger.info(f"Mensagem enviada com sucesso: {chunk[:18]}...")
+            delay = self._reserve_send_slot(chat_id)
+            if delay > 0:
+                time.sleep(delay)
+            self._post_chunk(chat_id, chunk)
+
+    async def _send_to_chat(self, identifier, message_chunks):
+        """Envia todos os pedaços para um chat, respeitando o limite de taxa dele"""
+        loop = asyncio.get_running_loop()
+        result = {"ok": False, "chat_id": None, "chunks_sent": 0, "error": None}
+        try:
+            chat_id = await loop.run_in_executor(self._executor, self.resolve_chat_id, identifier)
+            result["chat_id"] = chat_id
+            for chunk in message_chunks:
+                delay = self._reserve_send_slot(chat_id)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await loop.run_in_executor(self._executor, self._post_chunk, chat_id, chunk)
+                result["chunks_sent"] += 1
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    async def send_message_to_chats(self, identifiers, text):
+        """Envia a mesma mensagem para vários chats em paralelo.
+           Retorna {identificador: resultado da entrega} para cada chat."""
+        message_chunks = self.split_text(text)
+        results = await asyncio.gather(
+            *(self._send_to_chat(identifier, message_chunks) for identifier in identifiers)
+        )
+        return {str(identifier): result for identifier, result in zip(identifiers, results)}
+
+    def broadcast_message(self, identifiers, text):
+        """Versão síncrona de send_message_to_chats, para uso fora de um event loop"""
+        return asyncio.run(self.send_message_to_chats(identifiers, text))
 
     def list_interacted_users(self):
         """Lists all users who have interacted with the bot."""
-        url = f"https://api.telegram.org/bot{self.token}/getUpdates"
         try:
-            response = requests.get(url)
-            if response.status_code != 200:
-                self.logger.error(f"Erro ao obter atualizações: {response.text}")
-                raise Exception(f"Erro ao obter atualizações: {response.text}")
-
-            updates = response.json().get("result", [])
-            users = {}
-
-            for update in updates:
-                if "message" in update and "chat" in update["message"]:
-                    chat = update["message"]["chat"]
-                    chat_id = chat["id"]
-                    user_info = {
-                        "chat_id": chat_id,
-                        "username": chat.get("username", "N/A"),
-                        "first_name": chat.get("first_name", "N/A"),
-                        "phone_number": "N/A"
-                    }
-
-                    if "contact" in update["message"]:
-                        user_info["phone_number"] = update["message"]["contact"].get(
-                            "phone_number", "N/A")
-
-                    users[chat_id] = user_info
-
-            user_list = list(users.values())
+            with self._cache_lock:
+                self._poll_updates()
+                user_list = list(self.known_chats.values())
+
             if not user_list:
                 self.logger.info("Nenhum usuário encontrou interação com o bot.")
 
@@ -98,4 +288,9 @@ class TelegramBot:
 
         except Exception as e:
             self.logger.error(f"Erro ao listar usuários: {str(e)}")
-            raise Exception(f"Erro ao listar usuários: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Erro ao listar usuários: {str(e)}")
+
+    def close(self):
+        """Fecha as conexões do pool"""
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,93 @@
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ['TEST_MODE'] = '1'
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp(prefix='marketroxo_test_'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import LazyMessage, LogSampler, get_logger, log_event  # noqa: E402
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LazyMessageTest(unittest.TestCase):
+    def test_renders_template_with_fields(self):
+        message = LazyMessage("📄 {size} caracteres em {url}", {'size': 42, 'url': 'http://x'})
+        self.assertEqual(str(message), "📄 42 caracteres em http://x")
+
+    def test_callable_fields_are_evaluated_only_on_render(self):
+        calls = []
+        message = LazyMessage("{value}", {'value': lambda: calls.append(1) or 'ok'})
+        self.assertEqual(calls, [])
+        self.assertEqual(str(message), "ok")
+        self.assertEqual(calls, [1])
+
+    def test_sample_suffix(self):
+        message = LazyMessage("evento", {}, sample=(10, 21))
+        self.assertEqual(str(message), "evento [amostra 1/10, 21 ocorrências]")
+
+
+class LogSamplerTest(unittest.TestCase):
+    def test_lets_one_in_every_n_through(self):
+        sampler = LogSampler(5)
+        hits = [sampler.hit() for _ in range(12)]
+        self.assertEqual([total for total in hits if total is not None], [1, 6, 11])
+
+    def test_every_one_keeps_everything(self):
+        sampler = LogSampler(1)
+        self.assertEqual([sampler.hit() for _ in range(3)], [1, 2, 3])
+
+    def test_invalid_rate_falls_back_to_one(self):
+        self.assertEqual(LogSampler(0).every, 1)
+
+
+class LogEventTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = get_logger()
+        self.previous_level = self.logger.level
+        self.handler = _ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.logger.setLevel(self.previous_level)
+
+    def test_disabled_level_skips_formatting_and_sampling(self):
+        self.logger.setLevel(logging.INFO)
+        calls = []
+        sampler = LogSampler(2)
+        logged = log_event(logging.DEBUG, "{value}", sampler=sampler, value=lambda: calls.append(1))
+        self.assertFalse(logged)
+        self.assertEqual(calls, [])
+        self.assertEqual(self.handler.records, [])
+        self.assertEqual(sampler.hit(), 1)  # contador intocado pelo evento descartado
+
+    def test_enabled_level_logs_lazy_message_with_fields(self):
+        self.logger.setLevel(logging.DEBUG)
+        self.assertTrue(log_event(logging.DEBUG, "🔍 {url}", url='http://x'))
+        record = self.handler.records[-1]
+        self.assertIsInstance(record.msg, LazyMessage)
+        self.assertEqual(record.getMessage(), "🔍 http://x")
+        self.assertEqual(record.fields, {'url': 'http://x'})
+
+    def test_sampled_events_carry_counts(self):
+        self.logger.setLevel(logging.INFO)
+        sampler = LogSampler(3)
+        results = [log_event(logging.INFO, "evento", sampler=sampler) for _ in range(4)]
+        self.assertEqual(results, [True, False, False, True])
+        self.assertEqual([record.getMessage() for record in self.handler.records],
+                         ["evento [amostra 1/3, 1 ocorrências]", "evento [amostra 1/3, 4 ocorrências]"])
+
+
+if __name__ == '__main__':
+    unittest.main()
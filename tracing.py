@@ -0,0 +1,195 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging_config import get_logger
+from shared_state import JsonSlot
+
+# Spans aninhados por thread (ciclo -> conjunto -> página -> fetch/parse/...), guardados
+# num buffer circular. Os ciclos recentes são publicados em memória compartilhada para o
+# painel (/traces) e, opcionalmente, gravados em JSONL (TRACE_EXPORT_FILE).
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '5000'))
+TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE')
+PUBLISHED_TRACES = 20
+MAX_SPANS_PER_TRACE = 2000
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'tags', 'error', '_started')
+
+    def __init__(self, name, trace_id, span_id, parent_id, tags):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.tags = tags
+        self.error = None
+        self.duration = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+
+    def set_tag(self, key, value):
+        self.tags[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': round(self.start, 6),
+            'duration': round(self.duration if self.duration is not None else time.perf_counter() - self._started, 6),
+            'tags': self.tags,
+            'error': self.error,
+        }
+
+
+class Tracer:
+    """Tracer em processo: pilha de spans por thread + buffer circular dos finalizados"""
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE, export_file=TRACE_EXPORT_FILE, slot=None):
+        self.spans = deque(maxlen=buffer_size)
+        self.export_file = export_file
+        self.slot = slot
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._open_roots = {}
+        self._export = None
+
+    @property
+    def logger(self):
+        """Property que sempre retorna o logger atualizado"""
+        return get_logger()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **tags):
+        """with tracer.span('fetch', page=2) as s: ...; s.set_tag('status', 200)"""
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span_id = f"{os.getpid():x}-{next(self._ids):x}"
+        span = Span(name, parent.trace_id if parent else span_id, span_id,
+                    parent.span_id if parent else None, tags)
+        if parent is None:
+            self._open_roots[span.trace_id] = span
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            span.finish()
+            self._record(span, parent)
+
+    def _record(self, span, parent):
+        is_root = parent is None
+        with self._lock:
+            self.spans.append(span)
+            if is_root:
+                self._open_roots.pop(span.trace_id, None)
+            self._write_export(span, flush=is_root)
+        # Publica ao fim do ciclo e de cada etapa direta dele (ex.: cada conjunto de palavras)
+        if self.slot is not None and (is_root or parent.parent_id is None):
+            try:
+                self.publish()
+            except Exception as e:
+                self.logger.error(f"❌ Erro ao publicar traces: {str(e)}")
+
+    def _write_export(self, span, flush):
+        if not self.export_file:
+            return
+        try:
+            if self._export is None:
+                self._export = open(self.export_file, 'a', encoding='utf-8')
+            self._export.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            if flush:
+                self._export.flush()
+        except OSError as e:
+            self.logger.error(f"❌ Erro ao exportar spans para {self.export_file}: {str(e)}")
+            self.export_file = None
+
+    def traces(self, limit=PUBLISHED_TRACES):
+        """Traces mais recentes (inclusive o ciclo em andamento), do mais novo ao mais antigo"""
+        with self._lock:
+            finished = list(self.spans)
+            open_roots = list(self._open_roots.values())
+        by_trace = {}
+        for span in finished:
+            by_trace.setdefault(span.trace_id, []).append(span)
+        roots = {span.trace_id: span for span in finished if span.parent_id is None}
+        for span in open_roots:
+            roots.setdefault(span.trace_id, span)
+
+        traces = []
+        for root in sorted(roots.values(), key=lambda span: span.start, reverse=True)[:limit]:
+            spans = by_trace.get(root.trace_id, [])
+            if root.duration is None:
+                spans = spans + [root]
+            traces.append({
+                'trace_id': root.trace_id,
+                'name': root.name,
+                'start': round(root.start, 6),
+                'duration': root.to_dict()['duration'],
+                'tags': root.tags,
+                'error': root.error,
+                'in_progress': root.duration is None,
+                'pid': os.getpid(),
+                'spans': [span.to_dict() for span in spans[-MAX_SPANS_PER_TRACE:]],
+            })
+        return traces
+
+    def publish(self):
+        traces = self.traces()
+        while True:
+            try:
+                self.slot.publish({'traces': traces, 'published': time.time()})
+                return
+            except ValueError:
+                if len(traces) <= 1:
+                    raise
+                traces = traces[:len(traces) // 2]  # não coube no slot: publica menos ciclos
+
+
+TRACE_SLOT = JsonSlot("traces.shm")
+tracer = Tracer(slot=TRACE_SLOT)
+span = tracer.span
+
+
+def read_traces():
+    """Traces publicados pelo processo do monitor (ou os deste processo, se não houver)"""
+    published = TRACE_SLOT.snapshot()
+    if published is not None:
+        return published.get('traces', [])
+    return tracer.traces()
+
+
+def trace_summary(trace):
+    """Resumo de um trace para listagem: tempo total por tipo de span"""
+    by_name = {}
+    for span_data in trace['spans']:
+        if span_data['parent_id'] is None:
+            continue
+        totals = by_name.setdefault(span_data['name'], {'count': 0, 'duration': 0.0})
+        totals['count'] += 1
+        totals['duration'] = round(totals['duration'] + span_data['duration'], 6)
+    summary = {key: value for key, value in trace.items() if key != 'spans'}
+    summary['phases'] = by_name
+    return summary